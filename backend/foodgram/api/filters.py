@@ -1,14 +1,25 @@
 import django_filters
 
-from recipe.models import Recipe, Ingredient
+from recipe.models import Recipe, Ingredient, Tag
 from users.models import User
 
 
+RECIPE_ORDERINGS = {
+    'newest': ('-pub_date', '-id'),
+    'oldest': ('pub_date', 'id'),
+    'cooking_time': ('cooking_time', 'id'),
+    '-cooking_time': ('-cooking_time', '-id'),
+    'popularity': ('-favorites_count', '-pub_date', '-id'),
+}
+
+
 class RecipeFilter(django_filters.FilterSet):
-    """Фильтрация рецептов по тегам."""
+    """Фильтрация и сортировка рецептов."""
     author = django_filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = django_filters.AllValuesMultipleFilter(
+    tags = django_filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
     )
 
     is_favorited = django_filters.BooleanFilter(
@@ -17,6 +28,11 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.BooleanFilter(
         method='get_is_in_shopping_cart',
     )
+    cooking_time = django_filters.RangeFilter()
+    ordering = django_filters.ChoiceFilter(
+        choices=[(key, key) for key in RECIPE_ORDERINGS],
+        method='get_ordering',
+    )
 
     def get_is_favorited(self, queryset, name, value):
         if value:
@@ -28,9 +44,13 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(user_list__user=self.request.user)
         return queryset
 
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'cooking_time', 'ordering')
 
 
 class IngredientFilter(django_filters.FilterSet):
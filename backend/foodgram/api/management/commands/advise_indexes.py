@@ -0,0 +1,188 @@
+import json
+import re
+
+from django.core.management import BaseCommand
+from django.db import connection
+
+from recipe.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                           ShoppingList, Subscribe, Tag)
+from users.models import User
+
+# Индексы, которые нужны горячим запросам: (модель, колонки по порядку).
+EXPECTED_INDEXES = (
+    (Favorite, ('recipe_id', 'user_id')),
+    (ShoppingList, ('recipe_id', 'user_id')),
+    (Subscribe, ('author_id',)),
+    (Subscribe, ('follower_id', 'author_id')),
+    (Recipe.tags.through, ('tag_id', 'recipe_id')),
+    (IngredientInRecipe, ('ingredient_id', 'recipe_id')),
+    (Recipe, ('author_id', 'pub_date')),
+)
+
+FILTER_COLUMN = re.compile(r'"?(\w+)"?\)?(?:::\w+)?\s*(=|<>|<=|>=|<|>|~~\*?)')
+ROWS_BLOWUP = 10
+
+
+def hot_querysets(user_id):
+    """Запросы горячих эндпоинтов в том виде, в каком их строят вью."""
+    recipes = Recipe.objects.with_related().add_user_annotation(user_id)
+    tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+    sample = list(Recipe.objects.values_list('pk', flat=True)[:6])
+    return {
+        'recipes': recipes,
+        'recipes_by_tags': recipes.filter(tags__slug__in=tags).distinct(),
+        'recipes_by_author': recipes.filter(author_id=user_id),
+        'recipes_favorited': recipes.filter(is_favorited=True),
+        'recipes_in_cart': recipes.filter(is_in_shopping_cart=True),
+        'recipes_cooking_time': recipes.filter(
+            cooking_time__gte=10, cooking_time__lte=30
+        ).order_by('cooking_time', 'id'),
+        'recipes_popular': recipes.order_by(
+            '-favorites_count', '-pub_date', '-id'
+        ),
+        'recipe_tags_prefetch': Recipe.tags.through.objects.filter(
+            recipe_id__in=sample
+        ),
+        'recipe_ingredients_prefetch': IngredientInRecipe.objects.filter(
+            recipe_id__in=sample
+        ).select_related('ingredient'),
+        'subscriptions': User.objects.filter(
+            following__follower_id=user_id
+        ).order_by('id'),
+        'subscription_recipes': Recipe.objects.filter(
+            author__following__follower_id=user_id
+        ),
+        'shopping_list': IngredientInRecipe.objects.filter(
+            recipe__shopping_list__user_id=user_id
+        ).aggregate_totals(),
+        'ingredient_search': Ingredient.objects.filter(
+            name__icontains='сол'
+        ),
+    }
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def index_sql(table, columns):
+    name = '_'.join([table] + list(columns))[:55] + '_idx'
+    return (f'CREATE INDEX CONCURRENTLY {name} '
+            f'ON {table} ({", ".join(columns)});')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов горячих эндпоинтов, ищет '
+            'последовательные сканирования, ошибки оценки строк и '
+            'отсутствующие индексы и предлагает определения индексов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='id пользователя')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE: выполнить запросы и сравнить оценки'
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Не отмечать сканирования таблиц меньшего размера'
+        )
+
+    def handle(self, *args, **options):
+        user_id = options['user'] or User.objects.values_list(
+            'pk', flat=True
+        ).first() or 0
+        self.suggestions = {}
+        for name, queryset in hot_querysets(user_id).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            if connection.vendor == 'postgresql':
+                self.check_postgres(queryset, options)
+            else:
+                self.check_generic(queryset)
+        self.check_expected_indexes()
+        self.stdout.write(self.style.MIGRATE_HEADING('Предлагаемые индексы'))
+        if not self.suggestions:
+            self.stdout.write('  нет')
+        for sql, reason in self.suggestions.items():
+            self.stdout.write(f'  {sql}  -- {reason}')
+
+    def suggest(self, table, columns, reason):
+        self.suggestions.setdefault(index_sql(table, columns), reason)
+
+    def check_postgres(self, queryset, options):
+        sql, params = queryset.query.sql_with_params()
+        analyze = ', ANALYZE' if options['analyze'] else ''
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON{analyze}) {sql}', params)
+            result = cursor.fetchone()[0]
+        if isinstance(result, str):
+            result = json.loads(result)
+        plan = result[0]['Plan']
+        self.stdout.write(
+            f'  стоимость {plan["Total Cost"]}, строк {plan["Plan Rows"]}'
+        )
+        for node in plan_nodes(plan):
+            relation = node.get('Relation Name')
+            rows = node.get('Plan Rows', 0)
+            if node['Node Type'] == 'Seq Scan' and rows >= options[
+                'min_rows'
+            ]:
+                condition = node.get('Filter', '')
+                self.stdout.write(self.style.WARNING(
+                    f'  Seq Scan {relation} ({rows} строк) {condition}'
+                ))
+                if '~~*' in condition:
+                    self.suggestions.setdefault(
+                        'CREATE EXTENSION IF NOT EXISTS pg_trgm; '
+                        f'CREATE INDEX CONCURRENTLY {relation}_trgm_idx ON '
+                        f'{relation} USING gin (name gin_trgm_ops);',
+                        'поиск icontains'
+                    )
+                else:
+                    columns = list(dict.fromkeys(
+                        column for column, _ in FILTER_COLUMN.findall(
+                            condition
+                        )
+                    ))
+                    if columns:
+                        self.suggest(relation, columns, 'Seq Scan с фильтром')
+            actual = node.get('Actual Rows')
+            if actual is not None:
+                loops = node.get('Actual Loops', 1)
+                ratio = max(actual * loops, rows) / max(
+                    min(actual * loops, rows), 1
+                )
+                if ratio >= ROWS_BLOWUP:
+                    self.stdout.write(self.style.WARNING(
+                        f'  {node["Node Type"]} {relation or ""}: оценка '
+                        f'{rows} строк, фактически {actual * loops}'
+                    ))
+
+    def check_generic(self, queryset):
+        for line in queryset.explain().splitlines():
+            match = re.search(r'\bSCAN (?:TABLE )?(\w+)', line)
+            if match and 'USING' not in line:
+                self.stdout.write(self.style.WARNING(
+                    f'  полное сканирование {match.group(1)}'
+                ))
+
+    def check_expected_indexes(self):
+        self.stdout.write(self.style.MIGRATE_HEADING('Ожидаемые индексы'))
+        with connection.cursor() as cursor:
+            for model, columns in EXPECTED_INDEXES:
+                table = model._meta.db_table
+                constraints = connection.introspection.get_constraints(
+                    cursor, table
+                )
+                covered = any(
+                    (constraint['index'] or constraint['unique'])
+                    and tuple(constraint['columns'][:len(columns)]) == columns
+                    for constraint in constraints.values()
+                )
+                status = 'есть' if covered else 'нет'
+                self.stdout.write(
+                    f'  {table} ({", ".join(columns)}): {status}'
+                )
+                if not covered:
+                    self.suggest(table, columns, 'нужен горячим запросам')
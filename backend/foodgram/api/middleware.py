@@ -0,0 +1,163 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.db import connection
+from django.http import JsonResponse
+
+slow_request_logger = logging.getLogger('api.slow_requests')
+
+
+class ConcurrencyLimitMiddleware:
+    """Сброс нагрузки при превышении числа одновременных запросов.
+
+    Запросы всех процессов считаются атомарными счетчиками общего кеша,
+    при числе больше MAX_CONCURRENT_REQUESTS отвечает 503 с заголовком
+    Retry-After. Счетчик ведется по интервалам OVERLOAD_WINDOW секунд,
+    запрос уменьшает счетчик своего интервала, поэтому запросы процессов,
+    завершенных без ответа, перестают учитываться через два интервала.
+    """
+    cache = default_cache
+    key_prefix = 'concurrency'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = getattr(settings, 'MAX_CONCURRENT_REQUESTS', None)
+        self.retry_after = getattr(settings, 'OVERLOAD_RETRY_AFTER', 1)
+        self.window = getattr(settings, 'OVERLOAD_WINDOW', 30)
+
+    def acquire(self):
+        """Учет запроса, возвращает ключ счетчика и число запросов."""
+        window = int(time.time() // self.window)
+        key = f'{self.key_prefix}:{window}'
+        self.cache.add(key, 0, self.window * 2)
+        try:
+            current = self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, self.window * 2)
+            current = 1
+        previous = self.cache.get(f'{self.key_prefix}:{window - 1}', 0)
+        return key, current + previous
+
+    def release(self, key):
+        try:
+            self.cache.decr(key)
+        except ValueError:
+            pass
+
+    def __call__(self, request):
+        if not self.limit:
+            return self.get_response(request)
+        key, in_flight = self.acquire()
+        if in_flight > self.limit:
+            self.release(key)
+            response = JsonResponse(
+                {'detail': 'Сервер перегружен, повторите запрос позже.'},
+                status=503
+            )
+            response['Retry-After'] = str(self.retry_after)
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(key)
+
+
+class QueryRecorder:
+    """Обертка выполнения SQL, запоминающая запросы и их длительность."""
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'duration_ms': (time.perf_counter() - start) * 1000,
+            })
+
+
+class SlowRequestLogMiddleware:
+    """Журнал медленных запросов к API с SQL и планами выполнения.
+
+    Для доли запросов SLOW_REQUEST_SAMPLE_RATE записывает SQL, и если
+    запрос к api выполнялся дольше SLOW_REQUEST_THRESHOLD_MS, пишет в
+    лог api.slow_requests JSON с маршрутом, пользователем, временем,
+    всеми запросами и EXPLAIN самых медленных из них. Параметры SQL в
+    лог не попадают.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+        self.sample_rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 1)
+        self.explain_count = getattr(settings, 'SLOW_REQUEST_EXPLAIN_COUNT', 3)
+        self.explain_analyze = getattr(
+            settings, 'SLOW_REQUEST_EXPLAIN_ANALYZE', False
+        )
+
+    def __call__(self, request):
+        if not self.threshold or random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        if (total_ms >= self.threshold and match is not None
+                and match.app_name == 'api'):
+            self.log(request, response, total_ms, recorder.queries)
+        return response
+
+    def explain(self, query):
+        options = {'analyze': True} if self.explain_analyze else {}
+        prefix = connection.ops.explain_query_prefix(**options)
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {query["sql"]}', query['params'])
+                return '\n'.join(
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                )
+        except Exception as error:
+            return f'EXPLAIN не выполнен: {error}'
+
+    def log(self, request, response, total_ms, queries):
+        slowest = sorted(
+            (
+                query for query in queries if not query['many']
+                and query['sql'].lstrip().upper().startswith('SELECT')
+            ),
+            key=lambda query: query['duration_ms'],
+            reverse=True
+        )[:self.explain_count]
+        user = getattr(request, 'user', None)
+        slow_request_logger.warning(json.dumps({
+            'route': request.resolver_match.route,
+            'view': request.resolver_match.view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user': user.pk if user and user.is_authenticated else None,
+            'total_ms': round(total_ms, 2),
+            'sql_ms': round(
+                sum(query['duration_ms'] for query in queries), 2
+            ),
+            'queries': [
+                {
+                    'sql': query['sql'],
+                    'duration_ms': round(query['duration_ms'], 2),
+                } for query in queries
+            ],
+            'explain': [
+                {'sql': query['sql'], 'plan': self.explain(query)}
+                for query in slowest
+            ],
+        }, ensure_ascii=False))
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с размером страницы в параметре limit."""
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+
+class UserCursorPagination(CursorPagination):
+    """Курсорная пагинация пользователей, включается параметром cursor."""
+    ordering = 'id'
+    page_size_query_param = 'limit'
+    max_page_size = 100
@@ -0,0 +1,84 @@
+import cProfile
+import os
+import time
+
+from django.conf import settings
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+PROFILE_SUFFIX = '.prof'
+
+
+def get_profile_dir():
+    return getattr(
+        settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')
+    )
+
+
+def list_profiles():
+    """Сохраненные профили, от новых к старым."""
+    directory = get_profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'created': stat.st_mtime,
+            })
+    return sorted(profiles, key=lambda item: item['created'], reverse=True)
+
+
+def get_profile_path(name):
+    """Путь к профилю по имени или None, если такого нет."""
+    name = os.path.basename(name)
+    path = os.path.join(get_profile_dir(), name)
+    if name.endswith(PROFILE_SUFFIX) and os.path.isfile(path):
+        return path
+    return None
+
+
+def save_profile(profiler, name):
+    """Сохранение профиля с удалением самых старых сверх лимита."""
+    directory = get_profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, name))
+    limit = getattr(settings, 'PROFILE_MAX_FILES', 50)
+    for stale in list_profiles()[limit:]:
+        try:
+            os.remove(os.path.join(directory, stale['name']))
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMixin:
+    """Профилирование запроса cProfile по запросу персонала.
+
+    Включается заголовком X-Profile: 1 или параметром ?profile=1 и
+    только для is_staff. Имя сохраненного профиля возвращается в
+    заголовке X-Profile-Id. Без заголовка профилировщик не создается.
+    """
+    def initial(self, request, *args, **kwargs):
+        self.profiler = None
+        super().initial(request, *args, **kwargs)
+        if (
+            (request.headers.get(PROFILE_HEADER)
+             or request.query_params.get(PROFILE_PARAM))
+            and request.user.is_staff
+        ):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profiler = getattr(self, 'profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self.profiler = None
+            name = (f'{time.time_ns()}-{self.__class__.__name__}-'
+                    f'{request.method.lower()}{PROFILE_SUFFIX}')
+            save_profile(profiler, name)
+            response['X-Profile-Id'] = name
+        return super().finalize_response(request, response, *args, **kwargs)
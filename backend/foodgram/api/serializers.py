@@ -1,11 +1,21 @@
 import base64
+from contextlib import contextmanager
+from functools import partial
 
 from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from rest_framework.validators import UniqueTogetherValidator
 
 from recipe.models import (Ingredient, Tag, Recipe, Subscribe, Favorite,
-                           ShoppingList, IngredientInRecipe)
+                           ShoppingList, IngredientInRecipe, MealPlan,
+                           MealPlanItem)
+from recipe.images import image_urls
+from recipe.meal_plans import invalidate_meal_plans
+from recipe.nutrition import NUTRIENTS, update_recipe_nutrition
+from recipe.pantry import invalidate_pantry_index
+from tasks.queue import enqueue
 from users.models import User
 from .validators import CustomValidationException
 
@@ -20,6 +30,70 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом."""
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        try:
+            pks = [int(pk) for pk in data]
+        except (TypeError, ValueError):
+            child.fail('incorrect_type', data_type=type(data).__name__)
+        objects = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class SparseFieldsMixin:
+    """Ограничение полей ответа по fields и expand из контекста.
+
+    Связи из relation_id_fields, не указанные в expand, отдаются
+    первичными ключами.
+    """
+    relation_id_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is None:
+            return
+        expand = self.context.get('expand', set())
+        for name in list(self.fields):
+            if name not in fields:
+                self.fields.pop(name)
+            elif name in self.relation_id_fields and name not in expand:
+                self.fields[name] = self.relation_id_fields[name]()
+
+
+UNIQUE_NAME_ERROR_MARKERS = (
+    'unique_author_recipe_name', 'recipe_recipe.normalized_name'
+)
+
+
+@contextmanager
+def unique_name():
+    """Ошибка уникального индекса названия как ошибка валидации."""
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as error:
+        # PostgreSQL называет ограничение, SQLite - его поля
+        if not any(
+            marker in str(error) for marker in UNIQUE_NAME_ERROR_MARKERS
+        ):
+            raise
+        raise serializers.ValidationError({
+            api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы уже опубликовали этот рецепт!'
+            ]
+        })
+
+
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор чтения ингердиентов в рецепте."""
     id = serializers.ReadOnlyField(source='ingredient.id')
@@ -36,9 +110,7 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
 class IngredientInRecipeCreateSerializer(serializers.ModelSerializer):
     """Сериалзиатор создания ингредиентов в рецептах."""
     recipe = serializers.PrimaryKeyRelatedField(read_only=True)
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(write_only=True)
 
     class Meta:
@@ -70,6 +142,8 @@ class UserReadSerializer(serializers.ModelSerializer):
         model = User
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -77,26 +151,54 @@ class UserReadSerializer(serializers.ModelSerializer):
                                         author=obj).exists()
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор просмотра рецептов."""
+    relation_id_fields = {
+        'author': partial(serializers.ReadOnlyField, source='author_id'),
+        'tags': partial(
+            serializers.PrimaryKeyRelatedField, many=True, read_only=True
+        ),
+        'ingredients': partial(
+            serializers.PrimaryKeyRelatedField, many=True, read_only=True
+        ),
+    }
     tags = TagSerializer(read_only=True, many=True)
     ingredients = IngredientInRecipeSerializer(many=True, source='recipe')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     author = UserReadSerializer()
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
+    nutrition = serializers.SerializerMethodField()
 
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients', 'name', 'text',
                   'cooking_time', 'is_favorited', 'is_in_shopping_cart',
-                  'image')
+                  'image', 'images', 'favorites_count', 'cart_count',
+                  'nutrition')
         model = Recipe
 
+    def get_nutrition(self, obj):
+        return {name: round(getattr(obj, name), 1) for name in NUTRIENTS}
+
+    def get_images(self, obj):
+        return image_urls(obj, self.context.get('request'))
+
+    def to_representation(self, instance):
+        if (isinstance(self.fields.get('author'), UserReadSerializer)
+                and hasattr(instance, 'is_author_subscribed')):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request_user = self.context['request'].user
         return obj.favorite.filter(user=request_user.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request_user = self.context['request'].user
         return obj.shopping_list.filter(user=request_user.id).exists()
 
@@ -105,9 +207,10 @@ class RecipePostSerializer(serializers.ModelSerializer):
     """Сериализатор созданя рецептов."""
     image = Base64ImageField()
     ingredients = IngredientInRecipeCreateSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all(),
+    tags = BulkManyRelatedField(
+        child_relation=serializers.PrimaryKeyRelatedField(
+            queryset=Tag.objects.all()
+        )
     )
     author = serializers.CurrentUserDefault()
 
@@ -116,29 +219,20 @@ class RecipePostSerializer(serializers.ModelSerializer):
                   'image')
         model = Recipe
 
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Recipe.objects.all(),
-                fields=('name',),
-                message='Вы уже опубликовали этот рецепт!'
-            )
-        ]
-
     def validate_ingredients(self, data):
-        ingredients = self.initial_data.get('ingredients')
         if 'ingredients' not in self.initial_data:
             raise CustomValidationException('Добавьте ингредиенты!')
-        ingredient_list = []
-        for ingredient in ingredients:
-            if ingredient in ingredient_list:
-                raise CustomValidationException(
-                    'Ингредиенты не должны повторяться!'
-                )
-            ingredient_list.append(ingredient)
-        if int(ingredient['amount']) < 1:
+        ids = {item['id'] for item in data}
+        if len(ids) != len(data):
+            raise CustomValidationException(
+                'Ингредиенты не должны повторяться!'
+            )
+        if any(item['amount'] < 1 for item in data):
             raise CustomValidationException(
                 'Ингредиент не может быть нулевым или отрицательным!'
             )
+        if Ingredient.objects.filter(pk__in=ids).count() != len(ids):
+            raise CustomValidationException('Ингредиент не найден!')
         return data
 
     def validate_cooking_time(self, data):
@@ -153,7 +247,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         creation = [
             IngredientInRecipe(
                 recipe=recipe,
-                ingredient=ingredient['id'],
+                ingredient_id=ingredient['id'],
                 amount=ingredient['amount']
             ) for ingredient in ingredients
         ]
@@ -162,27 +256,61 @@ class RecipePostSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.ingredient_creation(recipe, ingredients)
+        with unique_name():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.ingredient_creation(recipe, ingredients)
+            update_recipe_nutrition(recipe.pk)
+            enqueue('recipe.update_similar_recipes', recipe_id=recipe.pk)
+            enqueue('recipe.build_image_variants', recipe_id=recipe.pk)
+        invalidate_pantry_index()
         return recipe
 
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        if tags is not None:
-            instance.tags.set(tags)
-        if ingredients is not None:
-            instance.ingredients.clear()
-        self.ingredient_creation(instance, ingredients)
-        return super().update(instance, validated_data)
+        ingredients_changed = set(
+            instance.recipe.values_list('ingredient_id', 'amount')
+        ) != {(item['id'], item['amount']) for item in ingredients}
+        with unique_name():
+            if tags is not None:
+                instance.tags.set(tags)
+            if ingredients_changed:
+                instance.ingredients.clear()
+                self.ingredient_creation(instance, ingredients)
+            enqueue('recipe.update_similar_recipes', recipe_id=instance.pk)
+            if 'image' in validated_data:
+                enqueue('recipe.build_image_variants', recipe_id=instance.pk)
+            instance = super().update(instance, validated_data)
+            if ingredients_changed:
+                update_recipe_nutrition(instance.pk)
+        if ingredients_changed:
+            invalidate_pantry_index()
+            invalidate_meal_plans()
+        return instance
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     """Мини-сериализатор просмотра рецептов."""
+    images = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
+
+    def get_images(self, obj):
+        return image_urls(obj, self.context.get('request'))
+
+
+class PantryRecipeSerializer(ShortRecipeSerializer):
+    """Сериализатор рецептов, подобранных по имеющимся ингредиентам."""
+    missing_count = serializers.IntegerField(read_only=True)
+    missing_ingredients = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + (
+            'missing_count', 'missing_ingredients'
+        )
 
 
 class AddFavoriteSerializer(serializers.ModelSerializer):
@@ -226,26 +354,20 @@ class AuthTokenSerializer(serializers.Serializer):
         fields = ('email', 'password')
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class SubscribeSerializer(SparseFieldsMixin, UserReadSerializer):
     """Сериализатор подписки пользователя."""
-    is_subscribed = serializers.SerializerMethodField()
+    relation_id_fields = {
+        'recipes': partial(
+            serializers.PrimaryKeyRelatedField, many=True, read_only=True
+        ),
+    }
     recipes = ShortRecipeSerializer(read_only=True, many=True)
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count')
-
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Subscribe.objects.filter(follower=request.user,
-                                        author=obj).exists()
+                  'is_subscribed', 'recipes', 'recipes_count',
+                  'followers_count')
 
 
 class AddSubscriptionSerializer(serializers.ModelSerializer):
@@ -276,3 +398,28 @@ class AddShoppingCartSerializer(serializers.ModelSerializer):
                 message='Вы уже добавили этот рецепт в список покупок!'
             )
         ]
+
+
+class MealPlanItemSerializer(serializers.ModelSerializer):
+    """Сериализатор блюда плана питания."""
+    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
+
+    class Meta:
+        model = MealPlanItem
+        fields = ('id', 'recipe', 'date', 'servings')
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['recipe'] = ShortRecipeSerializer(
+            instance.recipe, context=self.context
+        ).data
+        return data
+
+
+class MealPlanSerializer(serializers.ModelSerializer):
+    """Сериализатор плана питания."""
+    items = MealPlanItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = MealPlan
+        fields = ('id', 'name', 'version', 'items')
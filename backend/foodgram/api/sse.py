@@ -0,0 +1,109 @@
+"""SSE-поток событий о новых рецептах авторов, на которых подписан
+пользователь. Обслуживается ASGI-приложением из foodgram/asgi.py.
+
+Токен передается в заголовке Authorization или параметре token. При
+подключении выполняются два запроса к БД: проверка токена и список
+подписок; дальше события приходят из брокера без обращений к БД.
+"""
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.authtoken.models import Token
+
+from recipe.events import (OVERFLOW, author_channel, get_broker,
+                           user_channel)
+from recipe.models import Subscribe
+
+SSE_PATH = '/api/events/'
+
+
+@sync_to_async
+def get_channels(scope):
+    close_old_connections()
+    headers = dict(scope.get('headers', ()))
+    key = headers.get(b'authorization', b'').decode().partition(' ')[2]
+    if not key:
+        key = parse_qs(scope.get('query_string', b'').decode()).get(
+            'token', ['']
+        )[0]
+    token = Token.objects.filter(key=key, user__is_active=True).first()
+    if token is None:
+        return None, []
+    authors = Subscribe.objects.filter(
+        follower_id=token.user_id
+    ).values_list('author_id', flat=True)
+    return token.user_id, [author_channel(author) for author in authors]
+
+
+async def send_text(send, status, text):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def sse_application(scope, receive, send):
+    user_id, channels = await get_channels(scope)
+    if user_id is None:
+        await send_text(
+            send, 401, '{"detail": "Учетные данные не были предоставлены."}'
+        )
+        return
+    broker = get_broker()
+    subscription = broker.subscribe(
+        channels + [user_channel(user_id)],
+        getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+    )
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    disconnect = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        while not disconnect.done():
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), heartbeat
+                )
+            except asyncio.TimeoutError:
+                chunk = ': ping\n\n'
+            else:
+                if event is OVERFLOW:
+                    await send({
+                        'type': 'http.response.body',
+                        'body': b'event: overflow\ndata: {}\n\n',
+                    })
+                    break
+                if event['type'] in ('follow', 'unfollow'):
+                    change = (broker.add_channel if event['type'] == 'follow'
+                              else broker.remove_channel)
+                    change(subscription, author_channel(event['author']))
+                    continue
+                chunk = (f'event: {event["type"]}\n'
+                         f'data: {json.dumps(event, ensure_ascii=False)}\n\n')
+            await send({
+                'type': 'http.response.body',
+                'body': chunk.encode(),
+                'more_body': True,
+            })
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnect.cancel()
+        broker.unsubscribe(subscription)
@@ -0,0 +1,498 @@
+import base64
+import io
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from foodgram.startup import load_application
+from recipe import pantry
+from recipe.meal_plans import MEAL_PLAN_VERSION_KEY
+from recipe.units import seed_unit_conversions
+from recipe.models import (DeletionLog, Favorite, Ingredient,
+                           IngredientInRecipe, MealPlan, MealPlanItem, Recipe,
+                           ShoppingList, Subscribe, Tag)
+from users.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PAGE_SIZES = (2, 10)
+AUTHORS = 12
+RECIPES_PER_AUTHOR = 2
+INGREDIENTS_PER_RECIPE = 3
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, SLOW_REQUEST_THRESHOLD_MS=None)
+class QueryCountTests(APITestCase):
+    """Число SQL-запросов на маршрутах API.
+
+    Для списков число запросов сравнивается на двух размерах страницы и
+    не должно зависеть от количества строк в ответе.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}'
+            ) for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г'
+            ) for i in range(10)
+        ]
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com', password='pw'
+        )
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.com', password='pw',
+            is_staff=True
+        )
+        cls.authors = [
+            User.objects.create(
+                username=f'author{i}', email=f'author{i}@example.com',
+                password='pw'
+            ) for i in range(AUTHORS)
+        ]
+        cls.recipes = []
+        for number, author in enumerate(cls.authors * RECIPES_PER_AUTHOR):
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Текст',
+                cooking_time=number + 1, image='recipes/images/test.png'
+            )
+            recipe.tags.set(cls.tags[:2])
+            IngredientInRecipe.objects.bulk_create([
+                IngredientInRecipe(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + i) % 10],
+                    amount=10
+                ) for i in range(INGREDIENTS_PER_RECIPE)
+            ])
+            cls.recipes.append(recipe)
+        for author in cls.authors[1:]:
+            Subscribe.objects.create(follower=cls.user, author=author)
+        for recipe in cls.recipes[1:]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingList.objects.create(user=cls.user, recipe=recipe)
+        cls.token = Token.objects.create(user=cls.user)
+        cls.admin_token = Token.objects.create(user=cls.admin)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        pantry._index = None
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.anon = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.admin_token}'
+        )
+
+    def request(self, method, url, client=None, **kwargs):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, **kwargs)
+        return response, len(queries)
+
+    def assert_queries(self, expected, method, url, client=None,
+                       status_code=status.HTTP_200_OK, **kwargs):
+        response, count = self.request(method, url, client, **kwargs)
+        self.assertEqual(response.status_code, status_code, url)
+        self.assertEqual(count, expected, f'{method.upper()} {url}')
+        return response
+
+    def assert_paged_queries(self, expected, url, client=None):
+        separator = '&' if '?' in url else '?'
+        for limit in PAGE_SIZES:
+            response = self.assert_queries(
+                expected, 'get', f'{url}{separator}limit={limit}', client
+            )
+            self.assertEqual(
+                len(response.data['results']),
+                min(limit, response.data.get('count', limit)), url
+            )
+
+    def test_tags(self):
+        self.assert_queries(1, 'get', '/api/tags/', self.anon)
+        self.assert_queries(0, 'get', '/api/tags/', self.anon)
+        self.assert_queries(
+            1, 'get', f'/api/tags/{self.tags[0].pk}/', self.anon
+        )
+
+    def test_ingredients(self):
+        self.assert_queries(1, 'get', '/api/ingredients/', self.anon)
+        self.assert_queries(0, 'get', '/api/ingredients/', self.anon)
+        self.assert_queries(
+            1, 'get', '/api/ingredients/?name=Ингр', self.anon
+        )
+        self.assert_queries(
+            1, 'get', f'/api/ingredients/{self.ingredients[0].pk}/',
+            self.anon
+        )
+
+    def test_recipe_list_anonymous(self):
+        self.assert_paged_queries(4, '/api/recipes/', self.anon)
+
+    def test_recipe_list(self):
+        self.assert_paged_queries(5, '/api/recipes/')
+
+    def test_recipe_list_filters(self):
+        author = self.authors[0].pk
+        for query in (f'author={author}', 'tags=tag0', 'tags=tag0&tags=tag1',
+                      'is_favorited=1', 'is_in_shopping_cart=1',
+                      'cooking_time_min=1&cooking_time_max=100',
+                      'ordering=popularity', 'ordering=cooking_time'):
+            extra = 1 if query.startswith(('author', 'tags')) else 0
+            self.assert_paged_queries(5 + extra, f'/api/recipes/?{query}')
+
+    def test_recipe_list_sparse_fields(self):
+        self.assert_paged_queries(3, '/api/recipes/?fields=id,name')
+        self.assert_paged_queries(
+            5, '/api/recipes/?fields=id,tags,ingredients'
+        )
+        self.assert_paged_queries(
+            4, '/api/recipes/?fields=id&expand=author,tags'
+        )
+
+    def test_recipe_list_sparse_user_flags(self):
+        cases = (
+            ('fields=id,name', 0),
+            ('fields=id,is_favorited', 1),
+            ('fields=id&expand=author', 1),
+            ('fields=id,is_favorited,is_in_shopping_cart&expand=author', 3),
+            ('', 3),
+        )
+        for query, expected in cases:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(f'/api/recipes/?{query}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            page_sql = next(
+                captured['sql'] for captured in queries.captured_queries
+                if 'FROM "recipe_recipe"' in captured['sql']
+                and 'LIMIT' in captured['sql']
+            )
+            self.assertEqual(page_sql.count('EXISTS'), expected, query)
+
+    def test_recipe_ids(self):
+        for recipes in (self.recipes[:2], self.recipes[:10]):
+            ids = ','.join(str(recipe.pk) for recipe in recipes)
+            self.assert_queries(4, 'get', f'/api/recipes/?ids={ids}')
+
+    def test_recipe_detail(self):
+        recipe = self.recipes[0].pk
+        self.assert_queries(4, 'get', f'/api/recipes/{recipe}/')
+        self.assert_queries(3, 'get', f'/api/recipes/{recipe}/', self.anon)
+        self.assert_queries(3, 'get', f'/api/recipes/{recipe}/similar/')
+
+    def test_what_can_i_cook(self):
+        ids = ','.join(str(item.pk) for item in self.ingredients[:4])
+        url = f'/api/recipes/what_can_i_cook/?ingredients={ids}'
+        self.assert_queries(6, 'get', url)
+        self.assert_queries(3, 'get', url)
+        recipe = Recipe.objects.create(
+            author=self.user, name='Из запасов', text='Текст',
+            cooking_time=1, image='recipes/images/test.png'
+        )
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.ingredients[0], amount=1
+        )
+        self.recipes[0].delete()
+        pantry.invalidate_pantry_index()
+        response = self.assert_queries(5, 'get', url)
+        found = [item['id'] for item in response.data]
+        self.assertIn(recipe.pk, found)
+        self.assertNotIn(self.recipes[0].pk, found)
+
+    def recipe_data(self, name, size):
+        return {
+            'ingredients': [
+                {'id': item.pk, 'amount': 5}
+                for item in self.ingredients[:size]
+            ],
+            'tags': [tag.pk for tag in self.tags[:size]],
+            'name': name,
+            'text': 'Текст',
+            'cooking_time': 5,
+            'image': make_image(),
+        }
+
+    def test_recipe_write(self):
+        for size in (1, 3):
+            self.assert_queries(
+                16, 'post', '/api/recipes/', format='json',
+                data=self.recipe_data(f'Новый рецепт {size}', size),
+                status_code=status.HTTP_201_CREATED
+            )
+        recipe = Recipe.objects.get(name='Новый рецепт 3').pk
+        for size in (1, 3):
+            self.assert_queries(
+                20, 'patch', f'/api/recipes/{recipe}/', format='json',
+                data=self.recipe_data(f'Измененный рецепт {size}', size)
+            )
+        data = self.recipe_data('Измененный рецепт', 3)
+        self.assert_queries(
+            15, 'patch', f'/api/recipes/{recipe}/', format='json', data=data
+        )
+        self.assert_queries(
+            28, 'delete', f'/api/recipes/{recipe}/',
+            status_code=status.HTTP_204_NO_CONTENT
+        )
+
+    def test_subscriptions(self):
+        self.assert_paged_queries(4, '/api/users/subscriptions/')
+        self.assert_paged_queries(
+            3, '/api/users/subscriptions/?fields=id,username'
+        )
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.authors[0].pk}/subscribe/'
+        self.assert_queries(
+            8, 'post', url, status_code=status.HTTP_201_CREATED
+        )
+        self.assert_queries(
+            5, 'delete', url, status_code=status.HTTP_204_NO_CONTENT
+        )
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/favorite/'
+        self.assert_queries(
+            7, 'post', url, status_code=status.HTTP_201_CREATED
+        )
+        self.assert_queries(
+            6, 'delete', url, status_code=status.HTTP_204_NO_CONTENT
+        )
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipes[0].pk}/shopping_cart/'
+        self.assert_queries(
+            7, 'post', url, status_code=status.HTTP_201_CREATED
+        )
+        self.assert_queries(
+            6, 'delete', url, status_code=status.HTTP_204_NO_CONTENT
+        )
+
+    def test_download_shopping_cart(self):
+        url = '/api/recipes/download_shopping_cart/'
+        response = self.assert_queries(3, 'get', url)
+        self.assertNotIn('Калории', response.content.decode())
+        ShoppingList.objects.filter(user=self.user).exclude(
+            recipe__in=self.recipes[1:3]
+        ).delete()
+        Recipe.objects.filter(pk=self.recipes[1].pk).update(calories=250)
+        response = self.assert_queries(3, 'get', url)
+        self.assertIn('Калории: 250.0', response.content.decode())
+
+    def test_download_merges_units(self):
+        sugar = [
+            Ingredient.objects.create(name='Сахар', measurement_unit=unit)
+            for unit in ('г', 'кг')
+        ]
+        seed_unit_conversions()
+        for ingredient, amount in zip(sugar, (500, 2)):
+            IngredientInRecipe.objects.create(
+                recipe=self.recipes[1], ingredient=ingredient, amount=amount
+            )
+        response = self.assert_queries(
+            3, 'get', '/api/recipes/download_shopping_cart/'
+        )
+        self.assertIn('Сахар (г) - 2500\n', response.content.decode())
+
+    def test_meal_plans(self):
+        for number in range(PAGE_SIZES[0]):
+            MealPlan.objects.create(user=self.user, name=f'План {number}')
+        plan = MealPlan.objects.create(user=self.user, name='Неделя')
+        for day, recipe in enumerate(self.recipes[:4]):
+            MealPlanItem.objects.create(
+                plan=plan, recipe=recipe, date=date(2024, 1, day + 1),
+                servings=Decimal('1.5') if day % 2 else 1
+            )
+        self.assert_paged_queries(4, '/api/meal_plans/')
+        url = f'/api/meal_plans/{plan.pk}/'
+        self.assert_queries(3, 'get', url)
+        self.assert_queries(
+            6, 'post', f'{url}items/',
+            data={'recipe': self.recipes[0].pk, 'date': '2024-01-02',
+                  'servings': '2'},
+            status_code=status.HTTP_201_CREATED
+        )
+        download = f'{url}download_shopping_list/?end=2024-01-02'
+        response = self.assert_queries(4, 'get', download)
+        self.assertIn('Ингредиент 1 (г) - 45\n', response.content.decode())
+        self.assert_queries(2, 'get', download)
+        cache.delete(MEAL_PLAN_VERSION_KEY)
+        self.assert_queries(4, 'get', download)
+        item = plan.items.latest('id')
+        self.assert_queries(
+            4, 'delete', f'{url}items/{item.pk}/',
+            status_code=status.HTTP_204_NO_CONTENT
+        )
+        self.assert_queries(4, 'get', download)
+        self.assert_queries(
+            1, 'get', f'{url}download_shopping_list/?start=2024-13-01',
+            status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    @mock.patch('recipe.sync.SYNC_OVERLAP', timedelta(0))
+    def test_sync(self):
+        tokens = {}
+        for url in ('/api/sync/recipes/', '/api/sync/favorites/',
+                    '/api/sync/shopping_cart/'):
+            response = self.assert_queries(
+                5 if url == '/api/sync/recipes/' else 2, 'get', url
+            )
+            tokens[url] = response.data['token']
+            self.assert_queries(2, 'get', f'{url}?token={tokens[url]}')
+        token = tokens['/api/sync/recipes/']
+        self.assert_queries(
+            1, 'get', f'/api/sync/recipes/?token={token}', self.anon
+        )
+
+    def test_delete_user(self):
+        self.user.delete()
+        self.authors[0].delete()
+        connection.check_constraints()
+        self.assertFalse(User.objects.filter(username='reader'))
+        self.assertTrue(DeletionLog.objects.filter(
+            kind=DeletionLog.RECIPE, object_id=self.recipes[0].pk
+        ))
+
+    def test_users(self):
+        self.assert_paged_queries(3, '/api/users/')
+        self.assert_paged_queries(2, '/api/users/', self.anon)
+        self.assert_paged_queries(2, '/api/users/?cursor=')
+        self.assert_queries(2, 'get', f'/api/users/{self.authors[0].pk}/')
+        self.assert_queries(2, 'get', '/api/users/me/')
+
+    def test_user_search(self):
+        self.assert_paged_queries(3, '/api/users/?search=AUTHOR')
+        self.assert_paged_queries(3, '/api/users/?search=author&cursor=')
+        response = self.assert_queries(
+            2, 'get', '/api/users/?search=author1', self.anon
+        )
+        self.assertEqual(
+            [user['username'] for user in response.data['results']],
+            ['author1', 'author10', 'author11']
+        )
+        response = self.assert_queries(
+            3, 'get', '/api/users/?search=reader@example.com'
+        )
+        self.assertEqual(response.data['count'], 1)
+
+    def test_auth(self):
+        self.assert_queries(
+            2, 'post', '/api/auth/token/login/', self.anon,
+            data={'email': 'reader@example.com', 'password': 'pw'},
+            status_code=status.HTTP_201_CREATED
+        )
+        self.assert_queries(
+            2, 'post', '/api/auth/users/set_password/',
+            data={'current_password': 'pw', 'new_password': 'pw2'}
+        )
+        self.assert_queries(
+            2, 'post', '/api/auth/token/logout/',
+            status_code=status.HTTP_204_NO_CONTENT
+        )
+
+    @override_settings(MAX_CONCURRENT_REQUESTS=2)
+    def test_overload(self):
+        self.assert_queries(1, 'get', '/api/tags/', self.anon)
+        window = int(time.time() // settings.OVERLOAD_WINDOW)
+        cache.set_many({
+            f'concurrency:{window - 1}': 2, f'concurrency:{window}': 2
+        })
+        response = self.assert_queries(
+            0, 'get', '/api/tags/', self.anon,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_admin_routes(self):
+        self.assert_queries(1, 'get', '/api/profiles/', self.admin_client)
+        self.assert_queries(6, 'get', '/api/tasks/stats/', self.admin_client)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeNameTests(APITestCase):
+    """Уникальность названия рецепта в пределах автора."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г'
+        )
+        cls.author = User.objects.create(
+            username='author', email='author@example.com', password='pw'
+        )
+        cls.other = User.objects.create(
+            username='other', email='other@example.com', password='pw'
+        )
+
+    def post(self, user, name, ingredients=None):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/recipes/', {
+            'ingredients': ingredients or [
+                {'id': self.ingredient.pk, 'amount': 1}
+            ],
+            'tags': [self.tag.pk],
+            'name': name,
+            'text': 'Текст',
+            'cooking_time': 1,
+            'image': make_image(),
+        }, format='json')
+
+    def test_duplicate_name(self):
+        response = self.post(self.author, 'Борщ')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.post(self.author, '  борщ ')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['non_field_errors'],
+            ['Вы уже опубликовали этот рецепт!']
+        )
+        self.assertEqual(Recipe.objects.count(), 1)
+        response = self.post(self.other, 'Борщ')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_duplicate_ingredient(self):
+        response = self.post(self.author, 'Борщ', [
+            {'id': self.ingredient.pk, 'amount': 1},
+            {'id': self.ingredient.pk, 'amount': 2},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data['detail'], 'Ингредиенты не должны повторяться!'
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+
+class StartupTests(TestCase):
+    """Запуск приложения с прогревом кешей."""
+    def test_warmup_closes_connections(self):
+        with mock.patch('django.db.connections.close_all') as close_db:
+            with mock.patch.object(caches['default'], 'close') as close_cache:
+                _, report = load_application()
+        self.assertIn('warmup:pantry_index', report.phases)
+        close_db.assert_called_once_with()
+        close_cache.assert_called_once_with()
@@ -1,10 +1,13 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CustomSetPasswordView, DownloadView, FavoriteView,
-                    IngredientViewSet, RecipeViewSet, ShoppingCartView,
+from .views import (CustomSetPasswordView, DownloadView, FavoriteSyncView,
+                    FavoriteView, IngredientViewSet, MealPlanViewSet,
+                    ProfileDetailView, ProfileListView, RecipeSyncView,
+                    RecipeViewSet, ShoppingCartSyncView, ShoppingCartView,
                     SubscribeView, SubscriptionViewSet, TagViewSet,
-                    delete_jwt_token, get_jwt_token)
+                    TaskStatsView, UserViewSet, delete_jwt_token,
+                    get_jwt_token)
 
 app_name = 'api'
 
@@ -13,9 +16,11 @@ router = DefaultRouter()
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipe')
+router.register('meal_plans', MealPlanViewSet, basename='meal_plans')
 router.register(
     'users/subscriptions', SubscriptionViewSet, basename='subscriptions'
 )
+router.register('users', UserViewSet, basename='users')
 
 
 urlpatterns = [
@@ -31,6 +36,15 @@ urlpatterns = [
          name='favorite'),
     path('recipes/<int:id>/shopping_cart/', ShoppingCartView.as_view(),
          name='shopping_cart'),
+    path('sync/recipes/', RecipeSyncView.as_view(), name='sync_recipes'),
+    path('sync/favorites/', FavoriteSyncView.as_view(),
+         name='sync_favorites'),
+    path('sync/shopping_cart/', ShoppingCartSyncView.as_view(),
+         name='sync_shopping_cart'),
+    path('profiles/', ProfileListView.as_view(), name='profiles'),
+    path('profiles/<str:name>/', ProfileDetailView.as_view(),
+         name='profile'),
+    path('tasks/stats/', TaskStatsView.as_view(), name='task_stats'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
 ]
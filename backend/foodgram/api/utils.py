@@ -1,7 +1,12 @@
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
 from rest_framework import status
 from rest_framework.response import Response
 
+from recipe.nutrition import NUTRIENTS
+from .validators import CustomValidationException
+
 
 def add_item(
         request,
@@ -43,3 +48,81 @@ def remove_item(
     model_class.objects.filter(
         **{user_field: user}, **{field_name: item}).delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def parse_id_list(value, max_length=None):
+    """Разбор списка идентификаторов вида '1,2,3'."""
+    try:
+        ids = [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise CustomValidationException(
+            'Идентификаторы должны быть целыми числами!'
+        )
+    if max_length is not None and len(ids) > max_length:
+        raise CustomValidationException(
+            f'Можно передать не более {max_length} идентификаторов!'
+        )
+    return ids
+
+
+def parse_date_param(query_params, name):
+    """Дата из параметра запроса вида 'YYYY-MM-DD' или None."""
+    value = query_params.get(name)
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise CustomValidationException(
+            f'Параметр {name} должен быть датой в формате ГГГГ-ММ-ДД!'
+        )
+    return date
+
+
+def parse_fields(query_params, allowed, relations=()):
+    """Разбор параметров fields и expand вида 'id,name'.
+
+    Возвращает множество полей ответа (None, если fields не передан) и
+    множество связей, которые нужно отдать целиком, а не ключами.
+    """
+    if 'fields' not in query_params:
+        return None, set()
+    fields = {
+        name.strip() for name in query_params['fields'].split(',')
+        if name.strip()
+    }
+    expand = {
+        name.strip() for name in query_params.get('expand', '').split(',')
+        if name.strip()
+    }
+    unknown = (fields - set(allowed)) | (expand - set(relations))
+    if unknown:
+        raise CustomValidationException(
+            f'Неизвестные поля: {", ".join(sorted(unknown))}!'
+        )
+    return fields | expand, expand
+
+
+def shopping_list_response(items, filename='foodgram_shopping_cart.txt',
+                           nutrition=None):
+    """Файл списка покупок из агрегированных ингредиентов.
+
+    nutrition — суммы пищевой ценности, выводятся в конце файла,
+    если у ингредиентов есть данные о ней.
+    """
+    lines = [
+        f"{item['name']} ({item['units']}) - {item['total']}"
+        for item in items
+    ]
+    if nutrition and any(nutrition.values()):
+        lines.append('')
+        lines.extend(
+            f'{NUTRIENTS[name]}: {round(total, 1)}'
+            for name, total in nutrition.items()
+        )
+    text = '\n'.join(lines)
+    response = HttpResponse(text, content_type='text/plain')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -1,27 +1,63 @@
-from django.db.models import F, Sum
-from django.http import HttpResponse
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Value)
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser import views as djoser_views
 from rest_framework import status, viewsets
 from rest_framework.authtoken.models import Token
-from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       throttle_classes)
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import AccessToken
 
 from users.models import User
-from recipe.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                           ShoppingList, Subscribe, Tag)
+from recipe.models import (DeletionLog, Favorite, Ingredient,
+                           IngredientInRecipe, MealPlan, MealPlanItem,
+                           Recipe, ShoppingList, Subscribe, Tag, USER_FLAGS)
+from recipe.catalog import get_ingredients, get_tags
+from recipe.deletion import deactivate_user, purge_recipes
+from recipe.meal_plans import plan_shopping_list
+from recipe.nutrition import NUTRIENTS, cart_nutrition
+from recipe.pantry import PANTRY_RESULTS_LIMIT, get_pantry_index
+from recipe.similarity import SIMILAR_RECIPES_LIMIT
+from recipe.sync import InvalidSyncTokenError, get_changes
+from tasks.queue import enqueue
+from tasks.queue import stats as task_stats
 from .filters import RecipeFilter, IngredientFilter
+from .pagination import UserCursorPagination
 from .permissions import AuthorOrReadOnly, ReadOnly
+from .profiling import ProfilingMixin, get_profile_path, list_profiles
 from .serializers import (AddFavoriteSerializer, AddShoppingCartSerializer,
                           AddSubscriptionSerializer, AuthTokenSerializer,
-                          IngredientSerializer, RecipePostSerializer,
-                          RecipeReadSerializer, ShortRecipeSerializer,
-                          SubscribeSerializer, TagSerializer,
-                          UserReadSerializer, UserSerializer)
-from .utils import add_item, remove_item
+                          IngredientSerializer, MealPlanItemSerializer,
+                          MealPlanSerializer, PantryRecipeSerializer,
+                          RecipePostSerializer, RecipeReadSerializer,
+                          ShortRecipeSerializer, SubscribeSerializer,
+                          TagSerializer)
+from .throttling import LoginRateThrottle, WriteRateThrottle
+from .utils import (add_item, parse_date_param, parse_fields, parse_id_list,
+                    remove_item, shopping_list_response)
+from .validators import CustomValidationException
+
+
+RECIPE_IDS_LIMIT = 100
+USER_SEARCH_LIMIT = 50
+RECIPE_RELATIONS = ('author', 'tags', 'ingredients')
+RECIPE_FIELD_COLUMNS = {
+    'name': ('name',),
+    'text': ('text',),
+    'cooking_time': ('cooking_time',),
+    'image': ('image',),
+    'images': ('image', 'image_variants'),
+    'favorites_count': ('favorites_count',),
+    'cart_count': ('cart_count',),
+    'nutrition': tuple(NUTRIENTS),
+}
+SHORT_RECIPE_COLUMNS = ('id', 'author', 'name', 'image', 'image_variants',
+                        'cooking_time')
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -31,37 +67,157 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (ReadOnly,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return Response(get_tags())
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ProfilingMixin, viewsets.ModelViewSet):
     """Вьюсет рецептов."""
     queryset = Recipe.objects.all()
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    throttle_classes = (WriteRateThrottle,)
+    throttle_scope = 'recipe_write'
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipePostSerializer
 
+    def get_sparse_fields(self):
+        """Поля ответа из параметров fields и expand."""
+        if not hasattr(self, '_fields'):
+            if self.request.method == 'GET':
+                self._fields = parse_fields(
+                    self.request.query_params,
+                    RecipeReadSerializer.Meta.fields, RECIPE_RELATIONS
+                )
+            else:
+                self._fields = None, set()
+        return self._fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fields()
+        return context
+
+    def get_sparse_queryset(self, fields, expand):
+        """Только колонки и связи, нужные для запрошенных полей."""
+        columns = {'id', 'author'}
+        for name in fields:
+            columns.update(RECIPE_FIELD_COLUMNS.get(name, ()))
+        queryset = Recipe.objects.only(*columns)
+        if 'author' in expand:
+            queryset = queryset.select_related('author')
+        if 'tags' in expand:
+            queryset = queryset.prefetch_related('tags')
+        elif 'tags' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id'))
+            )
+        if 'ingredients' in expand:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ))
+        elif 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingredients', queryset=Ingredient.objects.only('id')
+            ))
+        return queryset
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        for _ in purge_recipes(Recipe.objects.filter(pk=instance.pk)):
+            pass
+
     def get_queryset(self):
-        queryset = Recipe.objects
-        user = self.request.user
-        queryset = queryset.add_user_annotation(user.pk)
-        if self.request.query_params.get('is_favorited'):
+        fields, expand = self.get_sparse_fields()
+        if fields is None:
+            queryset = Recipe.objects.with_related()
+        else:
+            queryset = self.get_sparse_queryset(fields, expand)
+        params = self.request.query_params
+        if fields is None:
+            flags = USER_FLAGS
+        else:
+            flags = {
+                flag for flag in ('is_favorited', 'is_in_shopping_cart')
+                if flag in fields or params.get(flag)
+            }
+            if 'author' in expand:
+                flags.add('is_author_subscribed')
+        queryset = queryset.add_user_annotation(self.request.user.pk, flags)
+        if params.get('is_favorited'):
             queryset = queryset.filter(is_favorited=True)
-        if self.request.query_params.get('is_in_shopping_cart'):
+        if params.get('is_in_shopping_cart'):
             queryset = queryset.filter(is_in_shopping_cart=True)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        if 'ids' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        ids = list(dict.fromkeys(parse_id_list(
+            request.query_params['ids'], RECIPE_IDS_LIMIT
+        )))
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in recipes],
+        })
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score')[:SIMILAR_RECIPES_LIMIT]
+        serializer = ShortRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'])
+    def what_can_i_cook(self, request):
+        ingredient_ids = parse_id_list(
+            request.query_params.get('ingredients', '')
+        )
+        if not ingredient_ids:
+            raise CustomValidationException('Укажите имеющиеся ингредиенты!')
+        matches = get_pantry_index().match(
+            ingredient_ids, PANTRY_RESULTS_LIMIT
+        )
+        recipes = Recipe.objects.in_bulk([pk for pk, _ in matches])
+        missing = {}
+        for item in IngredientInRecipe.objects.filter(
+            recipe__in=list(recipes)
+        ).exclude(ingredient__in=ingredient_ids).select_related('ingredient'):
+            missing.setdefault(item.recipe_id, []).append(item.ingredient)
+        results = []
+        for pk, missing_count in matches:
+            if pk in recipes:
+                recipe = recipes[pk]
+                recipe.missing_count = missing_count
+                recipe.missing_ingredients = missing.get(pk, [])
+                results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class IngredientViewSet(ProfilingMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет просмотра ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -70,33 +226,62 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        return Response(get_ingredients())
 
-class UserViewSet(viewsets.ModelViewSet):
-    """Вьюсет пользователя."""
-    queryset = User.objects.all()
-    serializer_class = UserSerializer
 
-    @action(
-        detail=False,
-        methods=['get', 'post'],
-    )
-    def me(self, request):
-        user = request.user
-        if request.method == 'POST':
-            serializer = UserSerializer(
-                user,
-                data=request.data,
-                partial=True
+class UserViewSet(djoser_views.UserViewSet):
+    """Вьюсет пользователей с подпиской текущего пользователя в запросе.
+
+    Параметр cursor включает курсорную пагинацию вместо постраничной,
+    параметр search ищет по началу логина, email и имени, лучшие
+    USER_SEARCH_LIMIT совпадений отдаются постранично.
+    """
+    def get_search_term(self):
+        if self.action != 'list':
+            return ''
+        return self.request.query_params.get('search', '').strip()
+
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('id')
+        user = self.request.user
+        if user.is_anonymous:
+            queryset = queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
             )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        serializer = UserReadSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        else:
+            queryset = queryset.annotate(
+                is_subscribed=Exists(
+                    Subscribe.objects.filter(
+                        follower=user, author=OuterRef('pk')
+                    )
+                )
+            )
+        term = self.get_search_term()
+        if term:
+            return queryset.search(term)[:USER_SEARCH_LIMIT]
+        return queryset
+
+    def perform_destroy(self, instance):
+        deactivate_user(instance)
+        enqueue('recipe.purge_user', user_id=instance.pk)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if ('cursor' in self.request.query_params
+                    and not self.get_search_term()):
+                self._paginator = UserCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginRateThrottle])
 def get_jwt_token(request):
     """Получение токена."""
     serializer = AuthTokenSerializer(data=request.data)
@@ -158,41 +343,118 @@ class CustomSetPasswordView(APIView):
         )
 
 
-class SubscriptionViewSet(viewsets.ReadOnlyModelViewSet):
-    """Вьюсет просмотра подписок пользователя."""
+class SubscriptionViewSet(ProfilingMixin, viewsets.ReadOnlyModelViewSet):
+    """Вьюсет просмотра подписок пользователя.
+
+    Параметры fields и expand ограничивают поля ответа, рецепты без
+    expand=recipes отдаются идентификаторами.
+    """
     serializer_class = SubscribeSerializer
 
+    def get_sparse_fields(self):
+        if not hasattr(self, '_fields'):
+            self._fields = parse_fields(
+                self.request.query_params,
+                SubscribeSerializer.Meta.fields, ('recipes',)
+            )
+        return self._fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'], context['expand'] = self.get_sparse_fields()
+        return context
+
     def get_queryset(self):
-        return User.objects.filter(following__follower=self.request.user)
+        fields, expand = self.get_sparse_fields()
+        queryset = User.objects.filter(
+            following__follower=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
+        if fields is not None:
+            queryset = queryset.only(*(
+                {'id'} | fields & {'email', 'username', 'first_name',
+                                   'last_name', 'recipes_count',
+                                   'followers_count'}
+            ))
+        if fields is None or 'recipes' in expand:
+            recipes = Recipe.objects.only(*SHORT_RECIPE_COLUMNS)
+        elif 'recipes' in fields:
+            recipes = Recipe.objects.only('id', 'author')
+        else:
+            return queryset
+        return queryset.prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        )
 
 
-class DownloadView(APIView):
+class DownloadView(ProfilingMixin, APIView):
     """Вью загрузки списка покупок."""
     def get(self, request):
-        items = IngredientInRecipe.objects.select_related(
-            'recipсe', 'ingredient'
-        ).filter(recipe__shopping_list__user=request.user)
-        items = items.values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
-            name=F('ingredient__name'),
-            units=F('ingredient__measurement_unit'),
-            total=Sum('amount'),
-        ).order_by('-total')
+        items = IngredientInRecipe.objects.filter(
+            recipe__shopping_list__user=request.user
+        ).aggregate_totals()
+        return shopping_list_response(
+            items, nutrition=cart_nutrition(request.user)
+        )
+
+
+class MealPlanViewSet(ProfilingMixin, viewsets.ModelViewSet):
+    """Вьюсет планов питания пользователя."""
+    serializer_class = MealPlanSerializer
+
+    def get_queryset(self):
+        return self.request.user.meal_plans.prefetch_related(Prefetch(
+            'items', queryset=MealPlanItem.objects.select_related(
+                'recipe'
+            ).only(
+                'plan', 'date', 'servings',
+                *(f'recipe__{name}' for name in SHORT_RECIPE_COLUMNS)
+            )
+        ))
 
-        text = '\n'.join([
-            f"{item['name']} ({item['units']}) - {item['total']}"
-            for item in items
-        ])
-        filename = "foodgram_shopping_cart.txt"
-        response = HttpResponse(text, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename{filename}'
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
 
-        return response
+    @action(detail=True, methods=['post'])
+    def items(self, request, pk):
+        plan = self.get_object()
+        serializer = MealPlanItemSerializer(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save(plan=plan)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['delete'],
+            url_path=r'items/(?P<item_id>\d+)')
+    def delete_item(self, request, pk, item_id):
+        item = get_object_or_404(
+            MealPlanItem, pk=item_id, plan__pk=pk, plan__user=request.user
+        )
+        item.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['get'])
+    def download_shopping_list(self, request, pk):
+        """Список покупок за период start..end, границы включаются."""
+        start = parse_date_param(request.query_params, 'start')
+        end = parse_date_param(request.query_params, 'end')
+        plan = get_object_or_404(
+            MealPlan.objects.only('id', 'version'), pk=pk, user=request.user
+        )
+        items, nutrition = plan_shopping_list(plan, start, end)
+        return shopping_list_response(
+            items, filename=f'foodgram_meal_plan_{plan.pk}.txt',
+            nutrition=nutrition
+        )
 
 
 class FavoriteView(APIView):
     """Вью добавления/удаления рецепта из избранного."""
+    throttle_classes = (WriteRateThrottle,)
+    throttle_scope = 'favorite'
+
     def post(self, request, id):
         id = id
         return add_item(
@@ -207,6 +469,9 @@ class FavoriteView(APIView):
 
 class SubscribeView(APIView):
     """Вью подписки/отписки от пользователя"""
+    throttle_classes = (WriteRateThrottle,)
+    throttle_scope = 'subscribe'
+
     def post(self, request, pk):
         id = pk
         return add_item(
@@ -223,6 +488,9 @@ class SubscribeView(APIView):
 
 class ShoppingCartView(APIView):
     """Вью добавления/удаления рецепта из списка покупок."""
+    throttle_classes = (WriteRateThrottle,)
+    throttle_scope = 'shopping_cart'
+
     def post(self, request, id):
         id = id
         return add_item(
@@ -235,3 +503,87 @@ class ShoppingCartView(APIView):
         return remove_item(
             request, id, ShoppingList, Recipe, 'recipe', 'user'
         )
+
+
+class SyncView(APIView):
+    """Вью дельта-синхронизации по токену из предыдущего ответа.
+
+    Без токена отдается полная выгрузка, постранично при has_more.
+    """
+    kind = None
+
+    def get_user(self):
+        return self.request.user
+
+    def get_changes(self):
+        try:
+            return get_changes(
+                self.kind, self.get_user(), self.request.query_params.get(
+                    'token'
+                )
+            )
+        except InvalidSyncTokenError:
+            raise CustomValidationException(
+                'Неверный токен синхронизации!'
+            )
+
+    def get(self, request):
+        return Response(self.get_changes(), status=status.HTTP_200_OK)
+
+
+class RecipeSyncView(SyncView):
+    """Синхронизация рецептов, измененные отдаются целиком."""
+    kind = DeletionLog.RECIPE
+    permission_classes = (AllowAny,)
+
+    def get_user(self):
+        return None
+
+    def get(self, request):
+        changes = self.get_changes()
+        if changes['updated']:
+            recipes = Recipe.objects.with_related().add_user_annotation(
+                request.user.pk
+            ).in_bulk(changes['updated'])
+            changes['updated'] = RecipeReadSerializer(
+                [recipes[pk] for pk in changes['updated'] if pk in recipes],
+                many=True, context={'request': request}
+            ).data
+        return Response(changes, status=status.HTTP_200_OK)
+
+
+class FavoriteSyncView(SyncView):
+    """Синхронизация избранного, отдаются id рецептов."""
+    kind = DeletionLog.FAVORITE
+
+
+class ShoppingCartSyncView(SyncView):
+    """Синхронизация списка покупок, отдаются id рецептов."""
+    kind = DeletionLog.SHOPPING_CART
+
+
+class ProfileListView(APIView):
+    """Вью списка сохраненных профилей запросов."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(list_profiles(), status=status.HTTP_200_OK)
+
+
+class ProfileDetailView(APIView):
+    """Вью скачивания профиля запроса."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, name):
+        path = get_profile_path(name)
+        if path is None:
+            raise Http404
+        return FileResponse(open(path, 'rb'), as_attachment=True)
+
+
+class TaskStatsView(APIView):
+    """Вью метрик очереди фоновых задач."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(task_stats(), status=status.HTTP_200_OK)
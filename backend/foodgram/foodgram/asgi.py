@@ -4,4 +4,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.sse import SSE_PATH, sse_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == SSE_PATH:
+        await sse_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -38,9 +38,12 @@ INSTALLED_APPS = [
     'api',
     'users',
     'recipe',
+    'tasks',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ConcurrencyLimitMiddleware',
+    'api.middleware.SlowRequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -87,6 +90,22 @@ DATABASES = {
     }
 }
 
+# Классы операторов в индексах поиска пользователей
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Общий кеш всех процессов: справочники, версии индексов, счетчики
+# ограничений частоты и одновременных запросов
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.memcached.PyMemcacheCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='memcached:11211'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -149,8 +168,63 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.getenv('THROTTLE_LOGIN', default='10/min'),
+        'favorite': os.getenv('THROTTLE_FAVORITE', default='60/min'),
+        'shopping_cart': os.getenv('THROTTLE_SHOPPING_CART', default='60/min'),
+        'subscribe': os.getenv('THROTTLE_SUBSCRIBE', default='30/min'),
+        'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', default='20/min'),
+    },
+}
+
+# Сброс нагрузки: максимум одновременных запросов всех процессов
+# (0 - выключено), счетчики в общем кеше по интервалам OVERLOAD_WINDOW
+MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', default=32))
+OVERLOAD_RETRY_AFTER = 1
+OVERLOAD_WINDOW = 30
+
+# Журнал медленных запросов к API (0 - выключено)
+SLOW_REQUEST_THRESHOLD_MS = int(os.getenv('SLOW_REQUEST_THRESHOLD_MS', default=500))
+SLOW_REQUEST_SAMPLE_RATE = float(os.getenv('SLOW_REQUEST_SAMPLE_RATE', default=0.1))
+SLOW_REQUEST_EXPLAIN_COUNT = 3
+SLOW_REQUEST_EXPLAIN_ANALYZE = os.getenv('SLOW_REQUEST_EXPLAIN_ANALYZE') == '1'
+
+# Профилирование запросов персонала (X-Profile: 1 или ?profile=1)
+PROFILE_DIR = os.getenv('PROFILE_DIR', default=os.path.join(BASE_DIR, 'profiles'))
+PROFILE_MAX_FILES = 50
+
+# События о новых рецептах (SSE /api/events/ через foodgram.asgi)
+EVENTS_BROKER = 'recipe.events.InMemoryBroker'
+EVENTS_QUEUE_SIZE = 100
+EVENTS_HEARTBEAT = 15
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.startup': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'api.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -0,0 +1,108 @@
+"""Прогрев кешей и отчет о времени запуска приложения.
+
+python -m foodgram.startup выполняет холодный запуск в отдельном
+процессе и печатает отчет в JSON, чтобы отслеживать регрессии.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from importlib import import_module
+
+logger = logging.getLogger('foodgram.startup')
+
+
+class StartupReport:
+    """Длительности этапов запуска в миллисекундах."""
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def as_json(self):
+        return json.dumps(self.phases, ensure_ascii=False)
+
+
+@contextmanager
+def timed_models_import(report):
+    """Замер импорта моделей каждого приложения во время django.setup."""
+    from django.apps import AppConfig
+
+    original = AppConfig.import_models
+
+    def import_models(app_config):
+        with report.phase(f'models:{app_config.name}'):
+            original(app_config)
+
+    AppConfig.import_models = import_models
+    try:
+        yield
+    finally:
+        AppConfig.import_models = original
+
+
+def warm_caches(report):
+    """Загрузка справочников и индексов, нужных первым запросам."""
+    from recipe.catalog import get_ingredients, get_tags
+    from recipe.pantry import get_pantry_index
+
+    with report.phase('warmup:tags'):
+        get_tags()
+    with report.phase('warmup:ingredients'):
+        get_ingredients()
+    with report.phase('warmup:pantry_index'):
+        get_pantry_index()
+
+
+def load_application(warmup=True):
+    """WSGI-приложение, собранное с замером этапов запуска.
+
+    При gunicorn --preload вызывается один раз в мастер-процессе, и
+    воркеры получают уже прогретое состояние при fork. Соединения с БД
+    и кешем закрываются, чтобы воркеры не делили один сокет.
+    """
+    from django.conf import settings
+    from django.core.cache import caches
+    from django.core.wsgi import get_wsgi_application
+    from django.db import DatabaseError, connections
+    from django.urls import get_resolver
+
+    report = StartupReport()
+    with report.phase('total'):
+        with report.phase('settings'):
+            installed_apps = settings.INSTALLED_APPS
+        for app in installed_apps:
+            with report.phase(f'import:{app}'):
+                import_module(app)
+        with timed_models_import(report), report.phase('django_setup'):
+            application = get_wsgi_application()
+        with report.phase('url_resolver'):
+            resolver = get_resolver()
+            resolver.url_patterns
+            resolver.reverse_dict
+        if warmup:
+            try:
+                warm_caches(report)
+            except DatabaseError as error:
+                logger.warning('Прогрев кешей не выполнен: %s', error)
+            finally:
+                connections.close_all()
+                for cache in caches.all():
+                    cache.close()
+    logger.info('startup %s', report.as_json())
+    return application, report
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    _, startup_report = load_application(
+        warmup=os.getenv('STARTUP_REPORT_WARMUP') == '1'
+    )
+    print(startup_report.as_json())
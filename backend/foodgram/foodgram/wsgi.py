@@ -2,6 +2,8 @@
 WSGI config for foodgram project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Caches are warmed before the callable is returned, so with
+``gunicorn --preload`` the workers inherit them from the master process.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
@@ -9,8 +11,10 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+from foodgram.startup import load_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_wsgi_application()
+application, startup_report = load_application(
+    warmup=os.getenv('WARMUP_ON_STARTUP', '1') == '1'
+)
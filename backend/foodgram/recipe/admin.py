@@ -1,7 +1,8 @@
 from django.contrib import admin
 
-from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingList, Subscribe, Tag)
+from .models import (Favorite, Ingredient, IngredientInRecipe, MealPlan,
+                     MealPlanItem, Recipe, ShoppingList, Subscribe, Tag,
+                     UnitConversion)
 
 
 class RecipeIngredientsInLine(admin.TabularInline):
@@ -17,6 +18,12 @@ class IngredientAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class UnitConversionAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'unit', 'canonical_unit', 'factor')
+    search_fields = ('unit',)
+    empty_value_display = '-пусто-'
+
+
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'author', 'number_of_additions',)
     list_filter = ('name', 'author', 'tags')
@@ -25,8 +32,7 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientsInLine,)
 
     def number_of_additions(self, obj):
-        favorites = Favorite.objects.filter(recipe=obj).count()
-        return favorites
+        return obj.favorites_count
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -49,15 +55,28 @@ class FavoriteAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class MealPlanItemInLine(admin.TabularInline):
+    model = MealPlanItem
+    extra = 1
+
+
+class MealPlanAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'name', 'user', 'version')
+    empty_value_display = '-пусто-'
+    inlines = (MealPlanItemInLine,)
+
+
 class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     empty_value_display = '-пусто-'
 
 
 admin.site.register(Ingredient, IngredientAdmin)
+admin.site.register(UnitConversion, UnitConversionAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(IngredientInRecipe, IngredientInRecipeAdmin)
 admin.site.register(Subscribe, SubscribeAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingList, ShoppingListAdmin)
+admin.site.register(MealPlan, MealPlanAdmin)
@@ -0,0 +1,35 @@
+"""Кеш справочников тегов и ингредиентов."""
+from django.core.cache import cache
+
+from .models import Ingredient, Tag
+
+TAGS_CACHE_KEY = 'catalog:tags'
+INGREDIENTS_CACHE_KEY = 'catalog:ingredients'
+
+
+def get_tags():
+    """Все теги в виде списка словарей."""
+    return cache.get_or_set(
+        TAGS_CACHE_KEY,
+        lambda: list(
+            Tag.objects.order_by('pk').values('id', 'name', 'color', 'slug')
+        ),
+        None
+    )
+
+
+def get_ingredients():
+    """Все ингредиенты в виде списка словарей."""
+    return cache.get_or_set(
+        INGREDIENTS_CACHE_KEY,
+        lambda: list(
+            Ingredient.objects.order_by('pk').values(
+                'id', 'name', 'measurement_unit'
+            )
+        ),
+        None
+    )
+
+
+def invalidate_catalog():
+    cache.delete_many([TAGS_CACHE_KEY, INGREDIENTS_CACHE_KEY])
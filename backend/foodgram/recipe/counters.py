@@ -0,0 +1,77 @@
+"""Денормализованные счетчики рецептов и пользователей.
+
+Счетчики меняются атомарно через F() из сигналов записи избранного,
+списка покупок, подписок и рецептов. Расхождения после массовых
+операций исправляет команда reconcile_counters.
+"""
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from users.models import User
+from .models import Favorite, Recipe, ShoppingList, Subscribe
+
+BATCH_SIZE = 1000
+
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe_id'),
+    'cart_count': (ShoppingList, 'recipe_id'),
+}
+USER_COUNTERS = {
+    'recipes_count': (Recipe, 'author_id'),
+    'followers_count': (Subscribe, 'author_id'),
+}
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарное изменение счетчика, не опускающееся ниже нуля."""
+    if pk is None:
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def reconcile(model, counters, batch_size=BATCH_SIZE):
+    """Пересчет счетчиков model пачками по pk.
+
+    Возвращает генератор пар (обработано, исправлено).
+    """
+    last_pk = 0
+    processed = fixed = 0
+    fields = list(counters)
+    while True:
+        objects = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', *fields)[:batch_size]
+        )
+        if not objects:
+            break
+        last_pk = objects[-1].pk
+        actual = {}
+        for field, (source, key) in counters.items():
+            actual[field] = dict(
+                source.objects.filter(**{f'{key}__in': objects})
+                .values_list(key).annotate(count=Count('pk')).order_by()
+            )
+        changed = []
+        for obj in objects:
+            values = {
+                field: actual[field].get(obj.pk, 0) for field in fields
+            }
+            if any(getattr(obj, field) != value
+                   for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                changed.append(obj)
+        model.objects.bulk_update(changed, fields)
+        processed += len(objects)
+        fixed += len(changed)
+        yield processed, fixed
+
+
+def reconcile_recipes(batch_size=BATCH_SIZE):
+    return reconcile(Recipe, RECIPE_COUNTERS, batch_size)
+
+
+def reconcile_users(batch_size=BATCH_SIZE):
+    return reconcile(User, USER_COUNTERS, batch_size)
@@ -0,0 +1,108 @@
+"""Удаление пользователей и рецептов небольшими транзакциями.
+
+Вместо каскада Django, который загружает все зависимые объекты в память
+и удаляет их одной транзакцией, зависимые строки удаляются пачками по
+первичному ключу без загрузки объектов и без сигналов, записи журнала
+удалений для синхронизации пишутся в той же транзакции. Счетчики рецептов
+авторов уменьшаются сразу, остальные после удаления пользователя
+пересчитываются фоновой задачей.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+from .counters import change_counter
+from .meal_plans import invalidate_meal_plans
+from .models import (DeletionLog, Favorite, IngredientInRecipe, MealPlan,
+                     MealPlanItem, Recipe, ShoppingList, SimilarRecipe,
+                     Subscribe)
+from .pantry import invalidate_pantry_index
+from .sync import TOMBSTONE_TTL, TOMBSTONES, tombstones
+
+BATCH_SIZE = 1000
+
+
+def delete_in_batches(queryset, batch_size=BATCH_SIZE, log=False):
+    """Удаление строк queryset пачками, возвращает генератор прогресса.
+
+    С log=True для удаляемых строк пишутся записи журнала удалений.
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        batch = model.objects.filter(pk__in=pks)
+        with transaction.atomic():
+            if log:
+                DeletionLog.objects.bulk_create(tombstones(batch))
+            deleted += batch._raw_delete(queryset.db)
+        yield model._meta.label, deleted
+
+
+def recipe_dependents(recipes):
+    """Зависимые от рецептов строки в порядке удаления."""
+    return (
+        Favorite.objects.filter(recipe__in=recipes),
+        ShoppingList.objects.filter(recipe__in=recipes),
+        MealPlanItem.objects.filter(recipe__in=recipes),
+        SimilarRecipe.objects.filter(recipe__in=recipes),
+        SimilarRecipe.objects.filter(similar__in=recipes),
+        IngredientInRecipe.objects.filter(recipe__in=recipes),
+        Recipe.tags.through.objects.filter(recipe__in=recipes),
+    )
+
+
+def purge_recipes(recipes, batch_size=BATCH_SIZE):
+    """Удаление рецептов и всех зависимых от них строк."""
+    authors = dict(
+        recipes.values_list('author_id').annotate(count=Count('pk'))
+        .order_by()
+    )
+    for queryset in recipe_dependents(recipes):
+        yield from delete_in_batches(
+            queryset, batch_size, log=queryset.model in TOMBSTONES
+        )
+    yield from delete_in_batches(recipes, batch_size, log=True)
+    for author_id, count in authors.items():
+        change_counter(User, author_id, 'recipes_count', -count)
+    invalidate_pantry_index()
+    invalidate_meal_plans()
+
+
+def deactivate_user(user):
+    """Немедленная блокировка аккаунта до фонового удаления данных."""
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    Token.objects.filter(user=user).delete()
+
+
+def purge_user(user_id, batch_size=BATCH_SIZE):
+    """Удаление пользователя со всеми рецептами, подписками и списками."""
+    user = User.objects.get(pk=user_id)
+    deactivate_user(user)
+    for queryset in (
+        Favorite.objects.filter(user=user),
+        ShoppingList.objects.filter(user=user),
+        Subscribe.objects.filter(follower=user),
+        Subscribe.objects.filter(author=user),
+        MealPlanItem.objects.filter(plan__user=user),
+        MealPlan.objects.filter(user=user),
+        DeletionLog.objects.filter(user=user),
+    ):
+        yield from delete_in_batches(queryset, batch_size)
+    yield from purge_recipes(Recipe.objects.filter(author=user), batch_size)
+    user.delete()
+    yield User._meta.label, 1
+
+
+def prune_deletion_log(batch_size=BATCH_SIZE):
+    """Удаление записей журнала старше срока действия токенов."""
+    yield from delete_in_batches(
+        DeletionLog.objects.filter(
+            deleted_at__lt=timezone.now() - TOMBSTONE_TTL
+        ),
+        batch_size
+    )
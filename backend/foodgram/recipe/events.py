@@ -0,0 +1,111 @@
+"""Публикация событий о рецептах подписчикам.
+
+Брокер по умолчанию хранит подписки в памяти процесса и работает, когда
+SSE-соединения и запись рецептов обслуживает один ASGI-процесс. Для
+нескольких процессов в EVENTS_BROKER указывается класс с тем же
+интерфейсом (subscribe, unsubscribe, publish) поверх общей шины.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+OVERFLOW = object()
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """Очередь событий одного соединения в его event loop."""
+    def __init__(self, channels, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.channels = set(channels)
+
+    def put(self, event):
+        """Вызывается из любого потока."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class InMemoryBroker:
+    """Pub/sub в памяти процесса без запросов к БД при рассылке."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def subscribe(self, channels, maxsize=100):
+        subscription = Subscription(channels, maxsize)
+        with self.lock:
+            for channel in subscription.channels:
+                self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def add_channel(self, subscription, channel):
+        with self.lock:
+            subscription.channels.add(channel)
+            self.channels.setdefault(channel, set()).add(subscription)
+
+    def remove_channel(self, subscription, channel):
+        with self.lock:
+            subscription.channels.discard(channel)
+            subscribers = self.channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[channel]
+
+    def unsubscribe(self, subscription):
+        for channel in list(subscription.channels):
+            self.remove_channel(subscription, channel)
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(
+                    settings, 'EVENTS_BROKER', 'recipe.events.InMemoryBroker'
+                ))()
+    return _broker
+
+
+def publish_new_recipe(recipe):
+    get_broker().publish(author_channel(recipe.author_id), {
+        'type': 'new_recipe',
+        'id': recipe.pk,
+        'name': recipe.name,
+        'author': recipe.author_id,
+    })
+
+
+def publish_follow_change(follower_id, author_id, following):
+    get_broker().publish(user_channel(follower_id), {
+        'type': 'follow' if following else 'unfollow',
+        'author': author_id,
+    })
@@ -0,0 +1,71 @@
+"""Уменьшенные копии изображений рецептов.
+
+Копии строятся фоновой задачей после загрузки изображения и, как и
+оригиналы, сохраняются под хешем содержимого. Пока копий нет, в ответах
+вместо них отдается оригинал.
+"""
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+
+from .models import Recipe
+
+IMAGE_VARIANTS = {'thumbnail': 320, 'medium': 800}
+VARIANTS_DIR = 'recipes/variants/'
+WEBP_QUALITY = 80
+
+
+def render_variant(image, width, image_format):
+    copy = image.copy()
+    copy.thumbnail((width, width * 4))
+    if image_format in ('JPEG', 'WEBP') and copy.mode not in ('RGB', 'L'):
+        copy = copy.convert('RGBA' if image_format == 'WEBP' else 'RGB')
+    buffer = io.BytesIO()
+    copy.save(buffer, image_format, quality=WEBP_QUALITY)
+    return ContentFile(buffer.getvalue())
+
+
+def build_image_variants(recipe):
+    """Создание копий изображения и запись их имен в рецепт."""
+    field = recipe.image
+    storage = field.storage
+    variants = {'source': field.name}
+    with field.open('rb') as source:
+        image = Image.open(source)
+        image.load()
+    image_format = image.format or 'PNG'
+    ext = os.path.splitext(field.name)[1].lstrip('.').lower() or 'png'
+    for variant, width in IMAGE_VARIANTS.items():
+        for key, fmt, suffix in ((variant, image_format, ext),
+                                 (f'{variant}_webp', 'WEBP', 'webp')):
+            variants[key] = storage.save(
+                f'{VARIANTS_DIR}{variant}.{suffix}',
+                render_variant(image, width, fmt)
+            )
+    Recipe.objects.filter(pk=recipe.pk, image=field.name).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    return variants
+
+
+def image_urls(recipe, request=None):
+    """Адреса оригинала и копий, вместо непостроенных — оригинал."""
+    if not recipe.image:
+        return None
+    storage = recipe.image.storage
+    original = recipe.image.url
+    variants = recipe.image_variants or {}
+    if variants.get('source') != recipe.image.name:
+        variants = {}
+    urls = {'original': original}
+    for variant in IMAGE_VARIANTS:
+        for key in (variant, f'{variant}_webp'):
+            urls[key] = (storage.url(variants[key]) if key in variants
+                         else original)
+    if request is not None:
+        urls = {key: request.build_absolute_uri(url)
+                for key, url in urls.items()}
+    return urls
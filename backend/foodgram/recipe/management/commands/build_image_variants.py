@@ -0,0 +1,37 @@
+from django.core.management import BaseCommand
+
+from recipe.images import build_image_variants
+from recipe.models import Recipe
+from recipe.storage import is_hashed_name
+
+
+class Command(BaseCommand):
+    help = ('Переименовывает изображения рецептов по хешу содержимого '
+            'и строит их уменьшенные копии.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить копии даже для уже обработанных изображений.'
+        )
+
+    def handle(self, *args, **options):
+        processed = renamed = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'pk', 'image', 'image_variants'
+        ).order_by('pk')
+        for recipe in recipes.iterator():
+            field = recipe.image
+            if not is_hashed_name(field.name):
+                with field.open('rb') as content:
+                    name = field.storage.save(field.name, content)
+                Recipe.objects.filter(pk=recipe.pk).update(image=name)
+                field.name = name
+                renamed += 1
+            variants = recipe.image_variants or {}
+            if options['force'] or variants.get('source') != field.name:
+                build_image_variants(recipe)
+                processed += 1
+        self.stdout.write(
+            f'Переименовано: {renamed}, обработано изображений: {processed}'
+        )
@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from recipe.meal_plans import invalidate_meal_plans
+from recipe.nutrition import BATCH_SIZE, build_nutrition
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает пищевую ценность всех рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for processed in build_nutrition(options['batch_size']):
+            self.stdout.write(f'Обработано рецептов: {processed}')
+        invalidate_meal_plans()
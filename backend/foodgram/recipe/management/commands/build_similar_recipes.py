@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipe.similarity import (BATCH_SIZE, SIMILAR_RECIPES_LIMIT,
+                               build_similar_recipes)
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс похожих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--limit', type=int, default=SIMILAR_RECIPES_LIMIT)
+
+    def handle(self, *args, **options):
+        for processed in build_similar_recipes(
+            options['batch_size'], options['limit']
+        ):
+            self.stdout.write(f'Обработано рецептов: {processed}')
@@ -0,0 +1,84 @@
+import gzip
+import json
+import sys
+
+from django.core.management import BaseCommand
+
+from recipe.models import IngredientInRecipe, Recipe
+
+CHUNK_SIZE = 500
+
+
+def open_stream(path, mode):
+    """Открытие файла JSONL, сжатого gzip при расширении .gz."""
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты с ингредиентами, тегами и авторами в JSONL. '
+            'Файлы изображений копируются отдельно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл (.jsonl или .jsonl.gz) или -')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        stream = open_stream(options['path'], 'w')
+        last_pk = 0
+        total = 0
+        try:
+            while True:
+                recipes = list(
+                    Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+                    .select_related('author')[:chunk_size]
+                )
+                if not recipes:
+                    break
+                last_pk = recipes[-1].pk
+                ingredients = {}
+                for row in IngredientInRecipe.objects.filter(
+                    recipe__in=recipes
+                ).values(
+                    'recipe_id', 'amount', 'ingredient__name',
+                    'ingredient__measurement_unit'
+                ):
+                    ingredients.setdefault(row['recipe_id'], []).append({
+                        'name': row['ingredient__name'],
+                        'measurement_unit': row[
+                            'ingredient__measurement_unit'
+                        ],
+                        'amount': row['amount'],
+                    })
+                tags = {}
+                for recipe_id, slug in Recipe.tags.through.objects.filter(
+                    recipe__in=recipes
+                ).values_list('recipe_id', 'tag__slug'):
+                    tags.setdefault(recipe_id, []).append(slug)
+                for recipe in recipes:
+                    author = recipe.author
+                    stream.write(json.dumps({
+                        'id': recipe.pk,
+                        'author': {
+                            'username': author.username,
+                            'email': author.email,
+                            'first_name': author.first_name,
+                            'last_name': author.last_name,
+                        },
+                        'name': recipe.name,
+                        'text': recipe.text,
+                        'cooking_time': recipe.cooking_time,
+                        'image': recipe.image.name,
+                        'pub_date': recipe.pub_date.isoformat(),
+                        'tags': tags.get(recipe.pk, []),
+                        'ingredients': ingredients.get(recipe.pk, []),
+                    }, ensure_ascii=False) + '\n')
+                total += len(recipes)
+                self.stderr.write(f'Выгружено рецептов: {total}')
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
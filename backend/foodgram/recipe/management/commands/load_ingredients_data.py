@@ -2,17 +2,48 @@ from csv import DictReader
 
 from django.core.management import BaseCommand
 from recipe.models import Ingredient
+from recipe.nutrition import NUTRIENTS
+from recipe.units import seed_unit_conversions
+from tasks.queue import enqueue
+
+
+def parse_nutrient(value):
+    """Необязательное значение пищевой ценности из CSV."""
+    if value is None or not value.strip():
+        return None
+    return float(value.replace(',', '.'))
 
 
 class Command(BaseCommand):
+    """Загрузка ингредиентов.
+
+    Необязательные колонки calories, proteins, fats и carbohydrates
+    задают пищевую ценность на единицу измерения, с ними уже загруженные
+    ингредиенты обновляются, а суммы рецептов пересчитываются фоном.
+    Для новых единиц измерения добавляются переводы в канонические.
+    """
     def handle(self, *args, **options):
         with open(
             'data/ingredients.csv', 'r', encoding='utf-8'
         ) as csvfile:
             reader = DictReader(csvfile)
+            nutrients = [name for name in NUTRIENTS
+                         if name in reader.fieldnames]
             for row in reader:
-                ingredient = Ingredient(
+                if not nutrients:
+                    ingredient = Ingredient(
+                        name=row['name'],
+                        measurement_unit=row['measurement_unit']
+                    )
+                    ingredient.save()
+                    continue
+                Ingredient.objects.update_or_create(
                     name=row['name'],
-                    measurement_unit=row['measurement_unit']
+                    measurement_unit=row['measurement_unit'],
+                    defaults={
+                        name: parse_nutrient(row[name]) for name in nutrients
+                    }
                 )
-                ingredient.save()
+        seed_unit_conversions()
+        if nutrients:
+            enqueue('recipe.build_nutrition', unique=True)
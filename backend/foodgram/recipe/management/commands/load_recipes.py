@@ -0,0 +1,157 @@
+import json
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipe.models import (Ingredient, IngredientInRecipe, Recipe, Tag,
+                           normalize_name)
+from recipe.pantry import invalidate_pantry_index
+from users.models import User
+from .dump_recipes import CHUNK_SIZE, open_stream
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSONL, созданного командой dump_recipes. '
+            'Рецепты, название которых у автора уже есть, пропускаются, '
+            'поэтому прерванную загрузку можно повторить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл (.jsonl или .jsonl.gz) или -')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('pk', 'name', 'measurement_unit')
+        }
+        stream = open_stream(options['path'], 'r')
+        total = skipped = 0
+        try:
+            while True:
+                rows = [
+                    json.loads(line) for line in
+                    islice(stream, options['chunk_size']) if line.strip()
+                ]
+                if not rows:
+                    break
+                with transaction.atomic():
+                    loaded = self.load_chunk(rows)
+                total += loaded
+                skipped += len(rows) - loaded
+                self.stdout.write(
+                    f'Загружено рецептов: {total}, пропущено: {skipped}'
+                )
+        finally:
+            stream.close()
+        invalidate_pantry_index()
+        self.stdout.write(
+            'Для обновления похожих рецептов, счетчиков и пищевой ценности '
+            'выполните build_similar_recipes, reconcile_counters и '
+            'build_nutrition.'
+        )
+
+    def get_authors(self, rows):
+        """Авторы чанка по username, недостающие создаются пачкой.
+
+        Автор, email которого занят другим пользователем, прерывает
+        загрузку с указанием рецепта.
+        """
+        authors = {row['author']['username']: row['author'] for row in rows}
+        existing = User.objects.in_bulk(authors, field_name='username')
+        new = {
+            username: author for username, author in authors.items()
+            if username not in existing
+        }
+        emails = dict(
+            User.objects.filter(
+                email__in=[author['email'] for author in new.values()]
+            ).values_list('email', 'username')
+        )
+        for row in rows:
+            username, email = row['author']['username'], row['author']['email']
+            if username not in new:
+                continue
+            owner = emails.setdefault(email, username)
+            if owner != username:
+                raise CommandError(
+                    f'Рецепт {row["id"]}: email {email} автора {username} '
+                    f'уже принадлежит пользователю {owner}'
+                )
+        User.objects.bulk_create(
+            [User(**author) for author in new.values()]
+        )
+        return dict(
+            User.objects.filter(username__in=authors)
+            .values_list('username', 'pk')
+        )
+
+    def new_rows(self, rows, authors):
+        """Рецепты чанка без тех, чье название у автора уже занято."""
+        keys = [
+            (authors[row['author']['username']], normalize_name(row['name']))
+            for row in rows
+        ]
+        taken = set(
+            Recipe.objects.filter(
+                author_id__in={author_id for author_id, _ in keys},
+                normalized_name__in={name for _, name in keys},
+            ).values_list('author_id', 'normalized_name')
+        )
+        fresh = []
+        for row, key in zip(rows, keys):
+            if key not in taken:
+                taken.add(key)
+                fresh.append(row)
+        return fresh
+
+    def load_chunk(self, rows):
+        """Загрузка чанка, возвращает число добавленных рецептов."""
+        authors = self.get_authors(rows)
+        rows = self.new_rows(rows, authors)
+        recipes = [
+            Recipe(
+                author_id=authors[row['author']['username']],
+                name=row['name'],
+                normalized_name=normalize_name(row['name']),
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=row['image'],
+                pub_date=(
+                    parse_datetime(row['pub_date']) if row.get('pub_date')
+                    else timezone.now()
+                ),
+            ) for row in rows
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+
+        ingredients = []
+        tags = []
+        for row, recipe in zip(rows, recipes):
+            for item in row['ingredients']:
+                key = (item['name'], item['measurement_unit'])
+                if key not in self.ingredients:
+                    raise CommandError(
+                        f'Рецепт {row["id"]}: ингредиент {key} '
+                        'не найден в справочнике'
+                    )
+                ingredients.append(IngredientInRecipe(
+                    recipe_id=recipe.pk,
+                    ingredient_id=self.ingredients[key],
+                    amount=item['amount'],
+                ))
+            tags.extend(
+                Recipe.tags.through(recipe_id=recipe.pk,
+                                    tag_id=self.tags[slug])
+                for slug in row['tags'] if slug in self.tags
+            )
+        IngredientInRecipe.objects.bulk_create(ingredients)
+        Recipe.tags.through.objects.bulk_create(tags)
+        return len(recipes)
@@ -0,0 +1,49 @@
+from django.core.management import BaseCommand
+from django.db import IntegrityError, transaction
+
+from recipe.models import Recipe, normalize_name
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Заполняет нормализованные названия рецептов, на которых '
+            'держится уникальность названия у автора.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        pending = Recipe.objects.filter(normalized_name__isnull=True)
+        last_pk = updated = 0
+        duplicates = []
+        while True:
+            recipes = list(
+                pending.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'name')[:options['batch_size']]
+            )
+            if not recipes:
+                break
+            last_pk = recipes[-1].pk
+            for recipe in recipes:
+                recipe.normalized_name = normalize_name(recipe.name)
+            try:
+                with transaction.atomic():
+                    Recipe.objects.bulk_update(recipes, ['normalized_name'])
+                updated += len(recipes)
+            except IntegrityError:
+                for recipe in recipes:
+                    try:
+                        with transaction.atomic():
+                            Recipe.objects.filter(pk=recipe.pk).update(
+                                normalized_name=recipe.normalized_name
+                            )
+                        updated += 1
+                    except IntegrityError:
+                        duplicates.append(recipe.pk)
+            self.stdout.write(f'Обновлено рецептов: {updated}')
+        if duplicates:
+            self.stdout.write(self.style.WARNING(
+                'Повторяющиеся у автора названия оставлены без изменений, '
+                f'id рецептов: {", ".join(map(str, duplicates))}'
+            ))
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+
+from recipe.deletion import BATCH_SIZE, prune_deletion_log
+
+
+class Command(BaseCommand):
+    help = ('Удаляет записи журнала удалений старше срока действия '
+            'токенов синхронизации.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for _, deleted in prune_deletion_log(options['batch_size']):
+            self.stdout.write(f'Удалено записей: {deleted}')
+        self.stdout.write(f'Готово, удалено записей: {deleted}')
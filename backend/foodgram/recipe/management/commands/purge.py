@@ -0,0 +1,28 @@
+from django.core.management import BaseCommand, CommandError
+
+from recipe.deletion import BATCH_SIZE, purge_recipes, purge_user
+from recipe.models import Recipe
+from tasks.queue import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Удаляет пользователя или рецепт с зависимыми данными пачками.'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--user', type=int, help='id пользователя')
+        group.add_argument('--recipe', type=int, help='id рецепта')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['user'] is not None:
+            progress = purge_user(options['user'], options['batch_size'])
+        else:
+            recipes = Recipe.objects.filter(pk=options['recipe'])
+            if not recipes.exists():
+                raise CommandError('Рецепт не найден')
+            progress = purge_recipes(recipes, options['batch_size'])
+        for label, deleted in progress:
+            self.stdout.write(f'{label}: удалено {deleted}')
+        if options['user'] is not None:
+            enqueue('recipe.reconcile_counters', unique=True)
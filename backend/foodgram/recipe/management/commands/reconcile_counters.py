@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipe.counters import BATCH_SIZE, reconcile_recipes, reconcile_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики рецептов и авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for name, reconcile in (('Рецепты', reconcile_recipes),
+                                ('Пользователи', reconcile_users)):
+            for processed, fixed in reconcile(options['batch_size']):
+                self.stdout.write(
+                    f'{name}: обработано {processed}, исправлено {fixed}'
+                )
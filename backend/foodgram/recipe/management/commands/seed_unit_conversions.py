@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from recipe.units import seed_unit_conversions
+
+
+class Command(BaseCommand):
+    help = ('Заполняет переводы единиц измерения из справочника '
+            'ингредиентов.')
+
+    def handle(self, *args, **options):
+        created = seed_unit_conversions()
+        self.stdout.write(f'Добавлено единиц измерения: {created}')
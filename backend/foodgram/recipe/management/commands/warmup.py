@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from foodgram.startup import StartupReport, warm_caches
+
+
+class Command(BaseCommand):
+    help = ('Прогревает кеши справочников и индексов. С --startup-report '
+            'замеряет холодный запуск приложения в отдельном процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--startup-report', action='store_true')
+
+    def handle(self, *args, **options):
+        report = StartupReport()
+        warm_caches(report)
+        self.stdout.write(report.as_json())
+        if options['startup_report']:
+            result = subprocess.run(
+                [sys.executable, '-m', 'foodgram.startup'],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            self.stdout.write(result.stdout.strip().splitlines()[-1])
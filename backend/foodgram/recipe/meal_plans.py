@@ -0,0 +1,88 @@
+"""Список покупок по плану питания за период.
+
+Ингредиенты всех блюд плана суммируются одним запросом с группировкой,
+количество умножается на порции блюда в том же запросе. Результат
+кешируется по версии плана, которая растет при любом изменении блюд,
+и по общей версии состава и пищевой ценности рецептов и единиц
+измерения.
+"""
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import F, FloatField, Sum
+
+from .models import IngredientInRecipe, MealPlanItem
+from .nutrition import NUTRIENTS
+
+MEAL_PLAN_CACHE_TIMEOUT = 60 * 60 * 24
+MEAL_PLAN_VERSION_KEY = 'meal_plan_recipes_version'
+
+
+def plan_items(plan, start=None, end=None):
+    """Блюда плана с датой в периоде, границы включаются."""
+    items = MealPlanItem.objects.filter(plan=plan)
+    if start is not None:
+        items = items.filter(date__gte=start)
+    if end is not None:
+        items = items.filter(date__lte=end)
+    return items
+
+
+def format_amount(value):
+    """Количество без лишних нулей: 45.00 -> 45, 22.50 -> 22.5."""
+    value = Decimal(value).quantize(Decimal('0.01'))
+    if value == value.to_integral_value():
+        return value.to_integral_value()
+    return value.normalize()
+
+
+def build_shopping_list(plan, start=None, end=None):
+    """Ингредиенты и пищевая ценность блюд плана за период."""
+    lookups = {'recipe__meal_plan_items__plan': plan}
+    if start is not None:
+        lookups['recipe__meal_plan_items__date__gte'] = start
+    if end is not None:
+        lookups['recipe__meal_plan_items__date__lte'] = end
+    items = IngredientInRecipe.objects.filter(**lookups).aggregate_totals(
+        scale='recipe__meal_plan_items__servings'
+    )
+    nutrition = plan_items(plan, start, end).aggregate(**{
+        name: Sum(
+            F(f'recipe__{name}') * F('servings'), output_field=FloatField()
+        )
+        for name in NUTRIENTS
+    })
+    return (
+        [{**item, 'total': format_amount(item['total'])} for item in items],
+        {name: total or 0.0 for name, total in nutrition.items()}
+    )
+
+
+def recipes_version():
+    """Общая версия списков покупок всех планов.
+
+    Вытесненная из кеша версия заменяется текущим временем, а не
+    начальным значением, чтобы не вернуть устаревшие списки.
+    """
+    version = time.time_ns()
+    if cache.add(MEAL_PLAN_VERSION_KEY, version, None):
+        return version
+    return cache.get(MEAL_PLAN_VERSION_KEY, version)
+
+
+def invalidate_meal_plans():
+    """Сброс кеша списков покупок всех планов во всех процессах."""
+    cache.set(MEAL_PLAN_VERSION_KEY, time.time_ns(), None)
+
+
+def plan_shopping_list(plan, start=None, end=None):
+    """Кешированный список покупок плана, пара (ингредиенты, ценность)."""
+    key = (
+        f'meal_plan:{plan.pk}:{plan.version}:{recipes_version()}:'
+        f'{start or ""}:{end or ""}'
+    )
+    return cache.get_or_set(
+        key, lambda: build_shopping_list(plan, start, end),
+        MEAL_PLAN_CACHE_TIMEOUT
+    )
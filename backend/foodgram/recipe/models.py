@@ -1,15 +1,53 @@
+from decimal import Decimal
 from typing import Optional
 
-from django.core.validators import RegexValidator
+from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db.models import Exists, F, OuterRef, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from users.models import User
+from .storage import ContentAddressedStorage
+
+
+def normalize_name(name):
+    """Название без различий в регистре и пробелах."""
+    return ' '.join(name.split()).casefold()
+
+
+class UnitConversion(models.Model):
+    """Перевод единицы измерения в каноническую.
+
+    Каноническая единица - наименьшая из совместимых, поэтому множитель
+    целый: кг -> г x 1000, л -> мл x 1000.
+    """
+    unit = models.CharField(max_length=200, unique=True)
+    canonical_unit = models.CharField(max_length=200)
+    factor = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f'{self.unit} -> {self.canonical_unit} x {self.factor}'
 
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=200)
     measurement_unit = models.CharField(max_length=200)
+    unit = models.ForeignKey(
+        UnitConversion,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ingredients'
+    )
+    calories = models.FloatField(
+        'Калории на единицу', null=True, blank=True
+    )
+    proteins = models.FloatField('Белки на единицу', null=True, blank=True)
+    fats = models.FloatField('Жиры на единицу', null=True, blank=True)
+    carbohydrates = models.FloatField(
+        'Углеводы на единицу', null=True, blank=True
+    )
 
     def __str__(self):
         return self.name
@@ -30,17 +68,40 @@ class Tag(models.Model):
         return self.name
 
 
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart', 'is_author_subscribed')
+
+
 class RecipeQuerySet(models.QuerySet):
-    def add_user_annotation(self, user_id: Optional[int]):
-        return self.annotate(
-            is_favorited=Exists(
-                Favorite.objects.filter(
-                    user_id=user_id, recipe__pk=OuterRef('pk')
-                )
+    def add_user_annotation(self, user_id: Optional[int], flags=USER_FLAGS):
+        """Признаки рецепта для пользователя, только перечисленные в flags."""
+        if user_id is None:
+            return self.annotate(**{
+                flag: Value(False, output_field=models.BooleanField())
+                for flag in flags
+            })
+        subqueries = {
+            'is_favorited': Favorite.objects.filter(
+                user_id=user_id, recipe__pk=OuterRef('pk')
+            ),
+            'is_in_shopping_cart': ShoppingList.objects.filter(
+                user_id=user_id, recipe__pk=OuterRef('pk')
             ),
-            is_in_shopping_cart=Exists(
-                ShoppingList.objects.filter(
-                    user_id=user_id, recipe__pk=OuterRef('pk')
+            'is_author_subscribed': Subscribe.objects.filter(
+                follower_id=user_id, author_id=OuterRef('author_id')
+            ),
+        }
+        return self.annotate(**{
+            flag: Exists(subqueries[flag]) for flag in flags
+        })
+
+    def with_related(self):
+        """Автор, теги и ингредиенты для сериализации без N+1."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
                 )
             ),
         )
@@ -53,10 +114,17 @@ class Recipe(models.Model):
         related_name='recipes'
     )
     name = models.CharField(max_length=200)
+    normalized_name = models.CharField(
+        max_length=200, null=True, editable=False
+    )
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=ContentAddressedStorage(),
         default=None
     )
+    image_variants = models.JSONField(
+        'Копии изображения', default=dict, blank=True, editable=False
+    )
     text = models.TextField()
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -64,11 +132,84 @@ class Recipe(models.Model):
     )
     cooking_time = models.IntegerField()
     tags = models.ManyToManyField(Tag, related_name='recipes')
+    pub_date = models.DateTimeField(
+        'Дата публикации',
+        default=timezone.now,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False
+    )
+    calories = models.FloatField('Калории', default=0, editable=False)
+    proteins = models.FloatField('Белки', default=0, editable=False)
+    fats = models.FloatField('Жиры', default=0, editable=False)
+    carbohydrates = models.FloatField('Углеводы', default=0, editable=False)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
     objects = RecipeQuerySet.as_manager()
 
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['author', 'normalized_name'],
+                name='unique_author_recipe_name'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_newest_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'], name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date', '-id'],
+                name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=['updated_at', 'id'], name='recipe_updated_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        super().save(*args, **kwargs)
+
+
+class IngredientInRecipeQuerySet(models.QuerySet):
+    def aggregate_totals(self, scale=None):
+        """Суммы ингредиентов по названию и канонической единице.
+
+        Количество переводится в каноническую единицу в том же запросе
+        группировки, ингредиенты без перевода суммируются как есть.
+        scale - путь к полю множителя количества.
+        """
+        amount = F('amount') * Coalesce(F('ingredient__unit__factor'), 1)
+        total = Sum(amount)
+        if scale is not None:
+            total = Sum(
+                amount * F(scale),
+                output_field=models.DecimalField(
+                    max_digits=12, decimal_places=2
+                )
+            )
+        return self.annotate(
+            name=F('ingredient__name'),
+            units=Coalesce(
+                F('ingredient__unit__canonical_unit'),
+                F('ingredient__measurement_unit')
+            ),
+        ).values('name', 'units').annotate(total=total).order_by('-total')
+
 
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
@@ -78,6 +219,7 @@ class IngredientInRecipe(models.Model):
     )
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE)
     amount = models.IntegerField()
+    objects = IngredientInRecipeQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -129,6 +271,7 @@ class Favorite(models.Model):
         null=True,
         related_name='favorite'
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         constraints = [
@@ -136,6 +279,11 @@ class Favorite(models.Model):
                 fields=['user', 'recipe'], name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'], name='favorite_updated_idx'
+            )
+        ]
 
 
 class ShoppingList(models.Model):
@@ -153,6 +301,7 @@ class ShoppingList(models.Model):
         null=True,
         related_name='shopping_list'
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         constraints = [
@@ -160,3 +309,117 @@ class ShoppingList(models.Model):
                 fields=['user', 'recipe'], name='unique_shopping_list'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'], name='shopping_list_updated_idx'
+            )
+        ]
+
+
+class SimilarRecipe(models.Model):
+    """Предрассчитанные соседи рецепта по ингредиентам и тегам."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to'
+    )
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'], name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'], name='similar_recipe_score_idx'
+            )
+        ]
+
+
+class MealPlan(models.Model):
+    """План питания пользователя, version меняется при изменении блюд."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='meal_plans'
+    )
+    name = models.CharField(max_length=200)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        ordering = ('-created_at', '-id')
+
+    def __str__(self):
+        return self.name
+
+
+class MealPlanItem(models.Model):
+    plan = models.ForeignKey(
+        MealPlan,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='meal_plan_items'
+    )
+    date = models.DateField()
+    servings = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=1,
+        validators=[MinValueValidator(Decimal('0.01'))]
+    )
+
+    class Meta:
+        ordering = ('date', 'id')
+        indexes = [
+            models.Index(fields=['plan', 'date'], name='meal_plan_item_idx')
+        ]
+
+
+class DeletionLog(models.Model):
+    """Записи об удалении для синхронизации клиентов."""
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.PositiveIntegerField()
+    # Без ограничения в БД: при каскадном удалении пользователя записи
+    # о его избранном и списке покупок создаются уже после выборки
+    # каскада и удаляются вместе с устаревшими по сроку
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='deletions',
+        db_constraint=False
+    )
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['kind', 'user', 'deleted_at', 'object_id'],
+                name='deletion_log_idx'
+            ),
+            models.Index(
+                fields=['deleted_at'], name='deletion_log_pruning_idx'
+            ),
+        ]
@@ -0,0 +1,108 @@
+"""Пищевая ценность рецептов.
+
+Суммы по рецептам хранятся в Recipe и пересчитываются пачками командой
+build_nutrition: матрица количеств ингредиентов в рецептах умножается
+на матрицу пищевой ценности ингредиентов на единицу измерения. При
+изменении ингредиентов рецепта суммы обновляются одним агрегатом.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import F, FloatField, Sum
+from django.utils import timezone
+
+from .models import Ingredient, IngredientInRecipe, Recipe
+
+NUTRIENTS = {
+    'calories': 'Калории',
+    'proteins': 'Белки',
+    'fats': 'Жиры',
+    'carbohydrates': 'Углеводы',
+}
+BATCH_SIZE = 1000
+
+
+def ingredient_matrix():
+    """Id ингредиентов и их пищевая ценность, неизвестная считается 0."""
+    rows = list(Ingredient.objects.order_by('pk').values_list(
+        'pk', *NUTRIENTS
+    ))
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    values = np.array(
+        [row[1:] for row in rows], dtype=float
+    ).reshape(-1, len(NUTRIENTS))
+    return ids, np.nan_to_num(values)
+
+
+def recipe_totals(recipe_ids, ingredient_ids, values):
+    """Суммы для рецептов recipe_ids, отсортированных по возрастанию."""
+    items = np.array(
+        IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids.tolist()
+        ).values_list('recipe_id', 'ingredient_id', 'amount'),
+        dtype=np.int64
+    ).reshape(-1, 3)
+    # Ингредиенты, созданные после выборки ingredient_ids, пропускаются:
+    # запросы выполняются без общего снимка БД
+    rows = np.searchsorted(ingredient_ids, items[:, 1])
+    known = rows < len(ingredient_ids)
+    known[known] = ingredient_ids[rows[known]] == items[known, 1]
+    items, rows = items[known], rows[known]
+    totals = np.zeros((len(recipe_ids), len(NUTRIENTS)))
+    np.add.at(
+        totals,
+        np.searchsorted(recipe_ids, items[:, 0]),
+        items[:, 2, None] * values[rows]
+    )
+    return totals
+
+
+def build_nutrition(batch_size=BATCH_SIZE):
+    """Пересчет сумм всех рецептов, возвращает генератор прогресса."""
+    ingredient_ids, values = ingredient_matrix()
+    processed = last_pk = 0
+    while True:
+        recipe_ids = np.fromiter(
+            Recipe.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size],
+            dtype=np.int64
+        )
+        if not len(recipe_ids):
+            break
+        last_pk = int(recipe_ids[-1])
+        totals = recipe_totals(recipe_ids, ingredient_ids, values)
+        # bulk_update не заполняет auto_now, а по updated_at идет
+        # синхронизация клиентов и индекса подбора по ингредиентам
+        updated_at = timezone.now()
+        recipes = [
+            Recipe(pk=pk, updated_at=updated_at, **dict(zip(NUTRIENTS, row)))
+            for pk, row in zip(recipe_ids.tolist(), totals.tolist())
+        ]
+        with transaction.atomic():
+            Recipe.objects.bulk_update(
+                recipes, [*NUTRIENTS, 'updated_at']
+            )
+        processed += len(recipes)
+        yield processed
+
+
+def update_recipe_nutrition(recipe_id):
+    """Пересчет сумм одного рецепта после изменения ингредиентов."""
+    totals = IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).aggregate(**{
+        name: Sum(
+            F('amount') * F(f'ingredient__{name}'),
+            output_field=FloatField()
+        ) for name in NUTRIENTS
+    })
+    Recipe.objects.filter(pk=recipe_id).update(updated_at=timezone.now(), **{
+        name: total or 0.0 for name, total in totals.items()
+    })
+
+
+def cart_nutrition(user):
+    """Суммы по рецептам из списка покупок пользователя."""
+    totals = Recipe.objects.filter(
+        shopping_list__user=user
+    ).aggregate(**{name: Sum(name) for name in NUTRIENTS})
+    return {name: total or 0.0 for name, total in totals.items()}
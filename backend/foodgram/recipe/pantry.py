@@ -0,0 +1,135 @@
+"""Подбор рецептов по имеющимся ингредиентам.
+
+Инвертированный индекс ингредиент -> рецепты хранится в памяти процесса.
+При смене версии в кеше индекс не перестраивается целиком: рецепты,
+измененные или удаленные после последней синхронизации, выбираются по
+updated_at и журналу удалений и хранятся поверх основного индекса.
+Полная перестройка выполняется, когда таких рецептов становится больше
+PANTRY_MAX_PATCHED.
+"""
+import threading
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import DeletionLog, Recipe
+from .similarity import RecipeVectors, rows_of
+from .sync import SYNC_OVERLAP, TOMBSTONE_TTL
+
+PANTRY_INDEX_VERSION_KEY = 'pantry_index_version'
+PANTRY_RESULTS_LIMIT = 50
+PANTRY_MAX_PATCHED = 1000
+
+_lock = threading.Lock()
+_index = None
+_version = None
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиентов рецептов."""
+    def __init__(self):
+        self.synced_at = timezone.now()
+        self.vectors = RecipeVectors()
+        self.patched = {}
+        self.patched_rows = np.empty(0, dtype=np.int64)
+
+    @property
+    def is_outdated(self):
+        return (len(self.patched) > PANTRY_MAX_PATCHED
+                or self.synced_at < timezone.now() - TOMBSTONE_TTL)
+
+    def refresh(self):
+        """Ингредиенты рецептов, измененных после прошлой синхронизации.
+
+        Удаленные рецепты получают пустой набор ингредиентов.
+        """
+        since = self.synced_at - SYNC_OVERLAP
+        self.synced_at = timezone.now()
+        changed = {}
+        for recipe_id, ingredient_id in Recipe.objects.filter(
+            updated_at__gte=since
+        ).values_list('pk', 'recipe__ingredient_id'):
+            ingredients = changed.setdefault(recipe_id, set())
+            if ingredient_id is not None:
+                ingredients.add(ingredient_id)
+        for recipe_id in DeletionLog.objects.filter(
+            kind=DeletionLog.RECIPE, user__isnull=True,
+            deleted_at__gte=since
+        ).values_list('object_id', flat=True):
+            changed[recipe_id] = set()
+        self.patched.update(changed)
+        patched_ids = np.fromiter(
+            self.patched, dtype=np.int64, count=len(self.patched)
+        )
+        self.patched_rows, _ = rows_of(
+            self.vectors.recipe_ids, patched_ids.reshape(-1, 1)
+        )
+
+    def match(self, ingredient_ids, limit=PANTRY_RESULTS_LIMIT):
+        """Рецепты с наименьшим числом недостающих ингредиентов.
+
+        Возвращает список пар (id рецепта, число недостающих).
+        """
+        vectors = self.vectors
+        requested = np.unique(np.asarray(ingredient_ids, dtype=np.int64))
+        columns = np.searchsorted(vectors.ingredient_ids, requested)
+        known = columns < len(vectors.ingredient_ids)
+        columns = columns[known]
+        columns = columns[vectors.ingredient_ids[columns] == requested[known]]
+        covered = np.bincount(
+            vectors.recipes_with(columns), minlength=len(vectors)
+        )
+        covered[self.patched_rows] = 0
+        candidates = np.flatnonzero(covered)
+        recipe_ids = vectors.recipe_ids[candidates]
+        covered = covered[candidates]
+        sizes = vectors.sizes[candidates]
+        if self.patched:
+            requested = set(requested.tolist())
+            extra = [
+                (recipe_id, len(ingredients & requested), len(ingredients))
+                for recipe_id, ingredients in self.patched.items()
+                if not ingredients.isdisjoint(requested)
+            ]
+            if extra:
+                extra = np.array(extra, dtype=np.int64)
+                recipe_ids = np.concatenate((recipe_ids, extra[:, 0]))
+                covered = np.concatenate((covered, extra[:, 1]))
+                sizes = np.concatenate((sizes, extra[:, 2]))
+        if not len(recipe_ids):
+            return []
+        missing = sizes - covered
+        rank = missing * (sizes.max() + 1) - covered
+        if len(recipe_ids) > limit:
+            best = np.argpartition(rank, limit - 1)[:limit]
+            recipe_ids, missing, rank = (
+                recipe_ids[best], missing[best], rank[best]
+            )
+        order = np.argsort(rank, kind='stable')
+        return list(zip(
+            recipe_ids[order].tolist(), missing[order].tolist()
+        ))
+
+
+def get_pantry_index():
+    """Индекс текущей версии с изменениями рецептов после построения."""
+    global _index, _version
+    version = cache.get_or_set(PANTRY_INDEX_VERSION_KEY, 1, None)
+    if _index is None or _version != version:
+        with _lock:
+            if _index is None or _index.is_outdated:
+                _index = PantryIndex()
+                _version = version
+            elif _version != version:
+                _version = version
+                _index.refresh()
+                if _index.is_outdated:
+                    _index = PantryIndex()
+    return _index
+
+
+def invalidate_pantry_index():
+    """Обновление индекса во всех процессах после изменения состава."""
+    cache.add(PANTRY_INDEX_VERSION_KEY, 1, None)
+    cache.incr(PANTRY_INDEX_VERSION_KEY)
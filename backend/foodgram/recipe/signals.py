@@ -0,0 +1,93 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import User
+from .catalog import invalidate_catalog
+from .counters import change_counter
+from .events import publish_follow_change, publish_new_recipe
+from .meal_plans import invalidate_meal_plans
+from .models import (Favorite, Ingredient, MealPlan, MealPlanItem, Recipe,
+                     ShoppingList, Subscribe, Tag, UnitConversion)
+from .sync import log_deletion
+from .units import link_ingredient_units
+
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingList: (Recipe, 'recipe_id', 'cart_count'),
+    Subscribe: (User, 'author_id', 'followers_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+}
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def catalog_changed(**kwargs):
+    """Сброс кеша справочников при изменении тегов и ингредиентов."""
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def counted_object_created(sender, instance, created, **kwargs):
+    """Увеличение счетчика при добавлении записи."""
+    if created:
+        model, key, field = COUNTERS[sender]
+        change_counter(model, getattr(instance, key), field, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def counted_object_deleted(sender, instance, **kwargs):
+    """Уменьшение счетчика при удалении записи."""
+    model, key, field = COUNTERS[sender]
+    change_counter(model, getattr(instance, key), field, -1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_delete, sender=Recipe)
+def deletion_logged(instance, **kwargs):
+    """Запись в журнал удалений для дельта-синхронизации."""
+    log_deletion(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    """Событие о новом рецепте для подписчиков автора."""
+    if created:
+        transaction.on_commit(lambda: publish_new_recipe(instance))
+
+
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def subscription_changed(instance, created=False, **kwargs):
+    """Обновление каналов открытых SSE-соединений подписчика."""
+    if instance.follower_id is not None:
+        following = kwargs['signal'] is post_save
+        if following and not created:
+            return
+        transaction.on_commit(lambda: publish_follow_change(
+            instance.follower_id, instance.author_id, following
+        ))
+
+
+@receiver([post_save, post_delete], sender=MealPlanItem)
+def meal_plan_changed(instance, **kwargs):
+    """Новая версия плана питания сбрасывает кеш его списка покупок."""
+    MealPlan.objects.filter(pk=instance.plan_id).update(
+        version=F('version') + 1
+    )
+    invalidate_meal_plans()
+
+
+@receiver(post_save, sender=UnitConversion)
+def unit_conversion_changed(instance, **kwargs):
+    """Привязка ингредиентов к переводу их единицы измерения."""
+    link_ingredient_units(instance.unit)
+    invalidate_meal_plans()
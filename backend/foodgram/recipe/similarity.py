@@ -0,0 +1,216 @@
+"""Индекс похожих рецептов.
+
+Рецепт представлен разреженным вектором ингредиентов и тегов, сходство
+считается как коэффициент Жаккара по ингредиентам плюс взвешенный
+коэффициент Жаккара по тегам. Полный индекс строит команда
+build_similar_recipes, при изменении ингредиентов рецепта индекс
+обновляется точечно функцией update_similar_recipes.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import IngredientInRecipe, Recipe, SimilarRecipe
+
+SIMILAR_RECIPES_LIMIT = 10
+TAG_WEIGHT = 0.25
+BATCH_SIZE = 500
+
+
+def score_candidates(size, tags_size, candidate_sizes, common,
+                     candidate_tags_sizes, common_tags):
+    """Оценка кандидатов по общим ингредиентам и тегам."""
+    union = size + candidate_sizes - common
+    scores = common / np.maximum(union, 1)
+    tags_union = tags_size + candidate_tags_sizes - common_tags
+    return scores + TAG_WEIGHT * common_tags / np.maximum(tags_union, 1)
+
+
+def top_k(candidates, scores, limit=SIMILAR_RECIPES_LIMIT):
+    """Лучшие limit кандидатов по убыванию оценки."""
+    if len(candidates) > limit:
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        candidates, scores = candidates[best], scores[best]
+    order = np.argsort(-scores, kind='stable')
+    return candidates[order], scores[order]
+
+
+def rows_of(recipe_ids, pairs):
+    """Строки рецептов для пар (recipe_id, x) и сами пары.
+
+    Пары рецептов, созданных после выборки recipe_ids, отбрасываются:
+    запросы выполняются без общего снимка БД.
+    """
+    rows = np.searchsorted(recipe_ids, pairs[:, 0])
+    known = rows < len(recipe_ids)
+    known[known] = recipe_ids[rows[known]] == pairs[known, 0]
+    return rows[known], pairs[known]
+
+
+class RecipeVectors:
+    """Разреженные векторы ингредиентов и тегов всех рецептов."""
+    def __init__(self):
+        self.recipe_ids = np.fromiter(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True),
+            dtype=np.int64
+        )
+        pairs = np.array(
+            IngredientInRecipe.objects.values_list(
+                'recipe_id', 'ingredient_id'
+            ),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        rows, pairs = rows_of(self.recipe_ids, pairs)
+        ingredients, columns = np.unique(pairs[:, 1], return_inverse=True)
+        self.ingredient_ids = ingredients
+        self.sizes = np.bincount(rows, minlength=len(self.recipe_ids))
+
+        by_recipe = np.argsort(rows, kind='stable')
+        self.recipe_ingredients = columns[by_recipe]
+        self.recipe_ptr = np.concatenate(([0], np.cumsum(self.sizes)))
+
+        by_ingredient = np.argsort(columns, kind='stable')
+        self.ingredient_recipes = rows[by_ingredient]
+        self.ingredient_ptr = np.concatenate((
+            [0], np.cumsum(np.bincount(columns, minlength=len(ingredients)))
+        ))
+
+        tag_pairs = np.array(
+            Recipe.tags.through.objects.values_list('recipe_id', 'tag_id'),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        tag_rows, tag_pairs = rows_of(self.recipe_ids, tag_pairs)
+        tags, tag_columns = np.unique(tag_pairs[:, 1], return_inverse=True)
+        self.tags = np.zeros(
+            (len(self.recipe_ids), len(tags)), dtype=np.int32
+        )
+        self.tags[tag_rows, tag_columns] = 1
+        self.tags_sizes = self.tags.sum(axis=1)
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def ingredients_of(self, row):
+        return self.recipe_ingredients[
+            self.recipe_ptr[row]:self.recipe_ptr[row + 1]
+        ]
+
+    def recipes_with(self, columns):
+        """Строки рецептов, содержащих ингредиенты columns (с повторами)."""
+        if not len(columns):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            self.ingredient_recipes[
+                self.ingredient_ptr[column]:self.ingredient_ptr[column + 1]
+            ] for column in columns
+        ])
+
+    def neighbours(self, row, limit=SIMILAR_RECIPES_LIMIT):
+        """Ближайшие соседи рецепта в строке row."""
+        candidates, common = np.unique(
+            self.recipes_with(self.ingredients_of(row)), return_counts=True
+        )
+        mask = candidates != row
+        candidates, common = candidates[mask], common[mask]
+        scores = score_candidates(
+            self.sizes[row], self.tags_sizes[row], self.sizes[candidates],
+            common, self.tags_sizes[candidates],
+            self.tags[candidates] @ self.tags[row]
+        )
+        candidates, scores = top_k(candidates, scores, limit)
+        return self.recipe_ids[candidates].tolist(), scores.tolist()
+
+
+def build_similar_recipes(batch_size=BATCH_SIZE, limit=SIMILAR_RECIPES_LIMIT):
+    """Полная перестройка индекса похожих рецептов."""
+    vectors = RecipeVectors()
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        for start in range(0, len(vectors), batch_size):
+            batch = []
+            for row in range(start, min(start + batch_size, len(vectors))):
+                recipe_id = int(vectors.recipe_ids[row])
+                batch.extend(
+                    SimilarRecipe(
+                        recipe_id=recipe_id, similar_id=similar, score=score
+                    ) for similar, score in zip(*vectors.neighbours(
+                        row, limit
+                    ))
+                )
+            SimilarRecipe.objects.bulk_create(batch)
+            yield min(start + batch_size, len(vectors))
+
+
+def _counts(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(count=Count('pk')).order_by()
+    )
+
+
+def update_similar_recipes(recipe_id, limit=SIMILAR_RECIPES_LIMIT):
+    """Точечное обновление индекса после изменения ингредиентов рецепта.
+
+    Пересчитывает соседей самого рецепта и добавляет его в списки тех
+    рецептов, для которых он теперь входит в top-K. Списки соседей
+    могут временно превышать K, при чтении берутся первые K по оценке.
+    """
+    ingredients = IngredientInRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).values('ingredient_id')
+    tags = Recipe.tags.through.objects.filter(recipe_id=recipe_id)
+    common = _counts(
+        IngredientInRecipe.objects.filter(
+            ingredient_id__in=ingredients
+        ).exclude(recipe_id=recipe_id),
+        'recipe_id'
+    )
+    candidates = np.fromiter(common, dtype=np.int64, count=len(common))
+    sizes = _counts(
+        IngredientInRecipe.objects.filter(recipe_id__in=common), 'recipe_id'
+    )
+    tags_sizes = _counts(
+        Recipe.tags.through.objects.filter(recipe_id__in=common), 'recipe_id'
+    )
+    common_tags = _counts(
+        Recipe.tags.through.objects.filter(
+            recipe_id__in=common, tag_id__in=tags.values('tag_id')
+        ),
+        'recipe_id'
+    )
+
+    def column(values):
+        return np.array(
+            [values.get(candidate, 0) for candidate in common], dtype=float
+        )
+
+    scores = score_candidates(
+        ingredients.count(), tags.count(), column(sizes), column(common),
+        column(tags_sizes), column(common_tags)
+    )
+    thresholds = {
+        row['recipe']: (row['count'], row['lowest'])
+        for row in SimilarRecipe.objects.filter(
+            recipe_id__in=common
+        ).exclude(similar_id=recipe_id).values('recipe').annotate(
+            count=Count('pk'), lowest=Min('score')
+        ).order_by()
+    }
+    reverse = [
+        SimilarRecipe(recipe_id=candidate, similar_id=recipe_id, score=score)
+        for candidate, score in zip(candidates.tolist(), scores.tolist())
+        if candidate not in thresholds
+        or thresholds[candidate][0] < limit
+        or score > thresholds[candidate][1]
+    ]
+    neighbours, scores = top_k(candidates, scores, limit)
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id=recipe_id).delete()
+        SimilarRecipe.objects.filter(similar_id=recipe_id).delete()
+        SimilarRecipe.objects.bulk_create(
+            [
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar, score=score
+                ) for similar, score in zip(neighbours.tolist(),
+                                            scores.tolist())
+            ] + reverse
+        )
@@ -0,0 +1,38 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """SHA-256 содержимого файла без загрузки его в память целиком."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed_name(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return len(stem) == 64 and all(c in '0123456789abcdef' for c in stem)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, сохраняющее файлы под хешем содержимого.
+
+    Одинаковые загрузки записываются один раз и получают одно имя,
+    поэтому файл может разделяться несколькими рецептами.
+    """
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, content_hash(content) + ext)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
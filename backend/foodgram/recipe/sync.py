@@ -0,0 +1,148 @@
+"""Дельта-синхронизация рецептов, избранного и списка покупок.
+
+Токен синхронизации подписан сервером и хранит курсор: время изменения
+и id последней отданной записи. Изменения и записи журнала удалений
+после курсора выбираются одним запросом UNION ALL по индексам
+(updated_at, id) и журнала удалений, поэтому синхронизация без
+изменений стоит одного запроса.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.db.models import BooleanField, F, Q, Value
+from django.utils import timezone
+
+from .models import DeletionLog, Favorite, Recipe, ShoppingList
+
+SYNC_LIMIT = 500
+SYNC_OVERLAP = timedelta(seconds=5)
+TOMBSTONE_TTL = timedelta(days=30)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+TOMBSTONES = {
+    Recipe: (DeletionLog.RECIPE, 'pk', None),
+    Favorite: (DeletionLog.FAVORITE, 'recipe_id', 'user_id'),
+    ShoppingList: (DeletionLog.SHOPPING_CART, 'recipe_id', 'user_id'),
+}
+
+
+class InvalidSyncTokenError(Exception):
+    pass
+
+
+def to_micro(moment):
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_micro(value):
+    return EPOCH + value * MICROSECOND
+
+
+def dump_token(kind, since, last_id=0, snapshot=None):
+    return signing.dumps([since, last_id, snapshot], salt=f'sync:{kind}')
+
+
+def load_token(kind, token):
+    try:
+        since, last_id, snapshot = signing.loads(token, salt=f'sync:{kind}')
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidSyncTokenError
+    return int(since), int(last_id), snapshot
+
+
+def tombstones(queryset):
+    """Записи журнала удалений для строк queryset."""
+    kind, object_field, user_field = TOMBSTONES[queryset.model]
+    if user_field is None:
+        return [
+            DeletionLog(kind=kind, object_id=object_id)
+            for object_id in queryset.values_list(object_field, flat=True)
+        ]
+    return [
+        DeletionLog(kind=kind, object_id=object_id, user_id=user_id)
+        for object_id, user_id in queryset.values_list(
+            object_field, user_field
+        )
+    ]
+
+
+def log_deletion(instance):
+    """Запись об удалении одного объекта."""
+    kind, object_field, user_field = TOMBSTONES[type(instance)]
+    DeletionLog.objects.create(
+        kind=kind, object_id=getattr(instance, object_field),
+        user_id=getattr(instance, user_field) if user_field else None
+    )
+
+
+def changed_rows(kind, user):
+    """Записи, изменения которых видит клиент, с полями (id, время)."""
+    if kind == DeletionLog.RECIPE:
+        return Recipe.objects.annotate(
+            key=F('id'), changed_at=F('updated_at')
+        )
+    model = Favorite if kind == DeletionLog.FAVORITE else ShoppingList
+    return model.objects.filter(user=user).annotate(
+        key=F('recipe_id'), changed_at=F('updated_at')
+    )
+
+
+def after(since, last_id):
+    return (Q(changed_at__gt=from_micro(since))
+            | Q(changed_at=from_micro(since), key__gt=last_id))
+
+
+def get_changes(kind, user=None, token=None, limit=SYNC_LIMIT):
+    """Изменения после токена.
+
+    Возвращает словарь с id измененных и удаленных объектов, новым
+    токеном, признаком has_more и признаком reset полной выгрузки.
+    """
+    now = timezone.now()
+    reset = token is None
+    snapshot = None
+    since = last_id = 0
+    if token is not None:
+        since, last_id, snapshot = load_token(kind, token)
+        if snapshot is None and from_micro(since) < now - TOMBSTONE_TTL:
+            reset = True
+            since = last_id = 0
+    if reset:
+        snapshot = to_micro(now)
+    rows = changed_rows(kind, user).filter(after(since, last_id)).annotate(
+        deleted=Value(False, output_field=BooleanField())
+    ).values_list('key', 'changed_at', 'deleted').order_by()
+    if snapshot is None:
+        rows = rows.union(
+            DeletionLog.objects.filter(
+                kind=kind, user=user if kind != DeletionLog.RECIPE else None
+            ).annotate(
+                key=F('object_id'), changed_at=F('deleted_at'),
+                deleted=Value(True, output_field=BooleanField())
+            ).filter(after(since, last_id)).values_list(
+                'key', 'changed_at', 'deleted'
+            ).order_by(),
+            all=True
+        )
+    rows = list(rows.order_by('changed_at', 'key')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    state = {}
+    for key, _, deleted in rows:
+        state[key] = deleted
+    if has_more:
+        cursor = (to_micro(rows[-1][1]), rows[-1][0])
+    elif snapshot is not None:
+        cursor = (to_micro(from_micro(snapshot) - SYNC_OVERLAP), 0)
+        snapshot = None
+    else:
+        cursor = max((to_micro(now - SYNC_OVERLAP), 0), (since, last_id))
+    return {
+        'updated': [key for key, deleted in state.items() if not deleted],
+        'deleted': [key for key, deleted in state.items() if deleted],
+        'token': dump_token(kind, *cursor, snapshot),
+        'has_more': has_more,
+        'reset': reset,
+    }
@@ -0,0 +1,53 @@
+from tasks.queue import enqueue, task
+from .counters import reconcile_recipes, reconcile_users
+from .deletion import prune_deletion_log, purge_user
+from .images import build_image_variants
+from .meal_plans import invalidate_meal_plans
+from .models import Recipe
+from .nutrition import build_nutrition
+from .similarity import build_similar_recipes, update_similar_recipes
+
+
+@task('recipe.update_similar_recipes')
+def update_similar_recipes_task(recipe_id):
+    update_similar_recipes(recipe_id)
+
+
+@task('recipe.build_similar_recipes')
+def build_similar_recipes_task():
+    for _ in build_similar_recipes():
+        pass
+
+
+@task('recipe.reconcile_counters')
+def reconcile_counters_task():
+    for reconcile in (reconcile_recipes, reconcile_users):
+        for _ in reconcile():
+            pass
+
+
+@task('recipe.purge_user')
+def purge_user_task(user_id):
+    for _ in purge_user(user_id):
+        pass
+    enqueue('recipe.reconcile_counters', unique=True)
+
+
+@task('recipe.build_image_variants')
+def build_image_variants_task(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is not None and recipe.image:
+        build_image_variants(recipe)
+
+
+@task('recipe.prune_deletion_log')
+def prune_deletion_log_task():
+    for _ in prune_deletion_log():
+        pass
+
+
+@task('recipe.build_nutrition')
+def build_nutrition_task():
+    for _ in build_nutrition():
+        pass
+    invalidate_meal_plans()
@@ -0,0 +1,58 @@
+"""Приведение единиц измерения ингредиентов к каноническим.
+
+Таблица UnitConversion заполняется из значений measurement_unit
+справочника ингредиентов: известные единицы переводятся в наименьшую
+совместимую, остальные остаются сами собой с множителем 1.
+"""
+from django.db.models import OuterRef, Subquery
+
+from .meal_plans import invalidate_meal_plans
+from .models import Ingredient, UnitConversion
+
+KNOWN_CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'шт': ('шт.', 1),
+    'шт.': ('шт.', 1),
+}
+
+
+def conversion_for(unit):
+    """Каноническая единица и множитель для единицы из справочника."""
+    return KNOWN_CONVERSIONS.get(unit.strip().lower(), (unit, 1))
+
+
+def link_ingredient_units(unit=None):
+    """Связь ингредиентов с переводом их единицы одним UPDATE."""
+    ingredients = Ingredient.objects.all()
+    if unit is not None:
+        ingredients = ingredients.filter(measurement_unit=unit)
+    return ingredients.update(unit=Subquery(
+        UnitConversion.objects.filter(
+            unit=OuterRef('measurement_unit')
+        ).values('pk')[:1]
+    ))
+
+
+def seed_unit_conversions():
+    """Переводы для новых единиц справочника, возвращает число новых."""
+    known = set(UnitConversion.objects.values_list('unit', flat=True))
+    units = set(
+        Ingredient.objects.values_list('measurement_unit', flat=True)
+        .distinct().order_by()
+    )
+    created = UnitConversion.objects.bulk_create(
+        [
+            UnitConversion(
+                unit=unit, canonical_unit=canonical, factor=factor
+            )
+            for unit in sorted(units - known)
+            for canonical, factor in [conversion_for(unit)]
+        ],
+        ignore_conflicts=True
+    )
+    link_ingredient_units()
+    invalidate_meal_plans()
+    return len(created)
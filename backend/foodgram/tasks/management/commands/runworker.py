@@ -0,0 +1,68 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.db import close_old_connections, connection
+
+from tasks.queue import VISIBILITY_TIMEOUT, claim, run, stats
+
+
+def run_in_thread(item, visibility_timeout):
+    try:
+        return run(item, visibility_timeout)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в пуле потоков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1)
+        parser.add_argument('--stats-interval', type=float, default=60)
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            default=int(VISIBILITY_TIMEOUT.total_seconds()),
+            help='Секунд до повторной выдачи зависшей задачи'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        visibility_timeout = timedelta(seconds=options['visibility_timeout'])
+        in_flight = set()
+        last_stats = time.monotonic()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            try:
+                while True:
+                    in_flight = {
+                        future for future in in_flight if not future.done()
+                    }
+                    tasks = []
+                    if len(in_flight) < threads:
+                        close_old_connections()
+                        tasks = claim(
+                            threads - len(in_flight), visibility_timeout
+                        )
+                        in_flight.update(
+                            executor.submit(
+                                run_in_thread, item, visibility_timeout
+                            )
+                            for item in tasks
+                        )
+                    if (time.monotonic() - last_stats
+                            >= options['stats_interval']):
+                        last_stats = time.monotonic()
+                        self.stdout.write(json.dumps(stats()))
+                    if options['once'] and not tasks and not in_flight:
+                        break
+                    if not tasks:
+                        time.sleep(options['poll_interval'])
+            except KeyboardInterrupt:
+                self.stdout.write('Остановка после текущих задач...')
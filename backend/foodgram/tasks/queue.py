@@ -0,0 +1,164 @@
+"""Очередь фоновых задач без внешнего брокера.
+
+Задачи регистрируются декоратором task в модулях tasks.py приложений,
+ставятся в очередь функцией enqueue и выполняются командой runworker.
+Взятая воркером задача невидима для других воркеров до истечения
+visibility timeout, после чего считается зависшей и берется повторно.
+Пока задача выполняется, поток heartbeat продлевает ее блокировку, так
+что повторно берутся только задачи остановившихся воркеров.
+"""
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Avg, DurationField, ExpressionWrapper, F, Min, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger('tasks')
+
+VISIBILITY_TIMEOUT = timedelta(minutes=5)
+RETRY_DELAY = timedelta(seconds=10)
+
+registry = {}
+
+
+def task(name):
+    """Регистрация функции как фоновой задачи."""
+    def decorator(func):
+        registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, unique=False, max_attempts=3, **payload):
+    """Постановка задачи в очередь.
+
+    С unique=True задача не дублируется, если такая же ждет выполнения.
+    """
+    if name not in registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    if unique and Task.objects.filter(
+        name=name, payload=payload, status=Task.PENDING
+    ).exists():
+        return None
+    return Task.objects.create(
+        name=name, payload=payload, max_attempts=max_attempts
+    )
+
+
+def claim(limit, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Захват до limit готовых задач, включая зависшие."""
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.filter(
+                Q(status=Task.PENDING, run_after__lte=now)
+                | Q(status=Task.RUNNING, locked_until__lt=now)
+            ).order_by('run_after', 'pk')
+            .select_for_update(skip_locked=True)[:limit]
+        )
+        Task.objects.filter(pk__in=[item.pk for item in tasks]).update(
+            status=Task.RUNNING,
+            locked_until=now + visibility_timeout,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+    for item in tasks:
+        item.attempts += 1
+        item.started_at = now
+    return tasks
+
+
+def extend_lock(item, stopped, visibility_timeout):
+    """Продление блокировки задачи каждую треть visibility timeout."""
+    interval = (visibility_timeout / 3).total_seconds()
+    try:
+        while not stopped.wait(interval):
+            try:
+                Task.objects.filter(pk=item.pk, status=Task.RUNNING).update(
+                    locked_until=timezone.now() + visibility_timeout
+                )
+            except DatabaseError:
+                logger.exception('Не удалось продлить задачу %s #%s',
+                                 item.name, item.pk)
+    finally:
+        connection.close()
+
+
+@contextmanager
+def heartbeat(item, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Блокировка задачи продлевается, пока выполняется блок."""
+    stopped = threading.Event()
+    thread = threading.Thread(
+        target=extend_lock, args=(item, stopped, visibility_timeout),
+        daemon=True
+    )
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run(item, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Выполнение захваченной задачи с повтором при ошибке."""
+    try:
+        with heartbeat(item, visibility_timeout):
+            registry[item.name](**item.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s завершилась ошибкой',
+                         item.name, item.pk)
+        if item.attempts < item.max_attempts:
+            Task.objects.filter(pk=item.pk).update(
+                status=Task.PENDING,
+                locked_until=None,
+                run_after=timezone.now() + RETRY_DELAY * 2 ** item.attempts,
+                error=error,
+            )
+        else:
+            Task.objects.filter(pk=item.pk).update(
+                status=Task.FAILED, finished_at=timezone.now(), error=error
+            )
+        return False
+    Task.objects.filter(pk=item.pk).update(
+        status=Task.DONE, locked_until=None, finished_at=timezone.now()
+    )
+    return True
+
+
+def stats(window=timedelta(hours=1)):
+    """Размер очереди и задержка выполнения задач."""
+    now = timezone.now()
+    pending = Task.objects.filter(status=Task.PENDING)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    latency = Task.objects.filter(
+        status=Task.DONE, finished_at__gte=now - window
+    ).aggregate(
+        latency=Avg(ExpressionWrapper(
+            F('started_at') - F('created_at'), output_field=DurationField()
+        )),
+        duration=Avg(ExpressionWrapper(
+            F('finished_at') - F('started_at'), output_field=DurationField()
+        )),
+    )
+    return {
+        'pending': pending.count(),
+        'running': Task.objects.filter(status=Task.RUNNING).count(),
+        'failed': Task.objects.filter(status=Task.FAILED).count(),
+        'oldest_pending_seconds': (
+            (now - oldest).total_seconds() if oldest else 0
+        ),
+        'avg_latency_seconds': (
+            latency['latency'].total_seconds() if latency['latency'] else 0
+        ),
+        'avg_duration_seconds': (
+            latency['duration'].total_seconds() if latency['duration'] else 0
+        ),
+    }
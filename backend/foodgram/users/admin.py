@@ -1,13 +1,19 @@
 from django.contrib import admin
 
-from .models import User
+from .models import SEARCH_FIELDS, User
 
 
 class UserAdmin(admin.ModelAdmin):
     list_display = ('pk', 'username', 'email')
     list_filter = ('username', 'email')
-    search_fields = ('username', 'email')
+    search_fields = SEARCH_FIELDS
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по началу полей с индексами по lower() вместо icontains."""
+        if not search_term.strip():
+            return queryset, False
+        return queryset.search(search_term), False
+
 
 admin.site.register(User, UserAdmin)
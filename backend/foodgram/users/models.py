@@ -1,6 +1,58 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.contrib.postgres.indexes import OpClass
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.functions import Lower
+
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+class PatternOpsIndex(models.Index):
+    """Индекс выражений для поиска LIKE 'x%' по префиксу.
+
+    На PostgreSQL выражения индексируются с классом операторов
+    text_pattern_ops, иначе индекс не используется при сортировке БД,
+    отличной от C. Класс выбирается при применении миграции, поэтому
+    миграции не зависят от БД, на которой выполнен makemigrations.
+    """
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        return models.Index(
+            *(OpClass(expression, name='text_pattern_ops')
+              for expression in self.expressions),
+            name=self.name
+        ).create_sql(model, schema_editor, using, **kwargs)
+
+
+class UserQuerySet(models.QuerySet):
+    def search(self, term):
+        """Пользователи, у которых логин, email или имя начинаются с term.
+
+        Регистр не учитывается, каждое слово term должно быть началом
+        одного из полей. Сначала точное совпадение логина или email,
+        затем совпадение по началу логина, затем остальные.
+        """
+        term = term.strip().lower()
+        queryset = self.annotate(**{
+            f'{name}_lower': Lower(name) for name in SEARCH_FIELDS
+        })
+        for word in term.split():
+            queryset = queryset.filter(Q(*(
+                Q(**{f'{name}_lower__startswith': word})
+                for name in SEARCH_FIELDS
+            ), _connector=Q.OR))
+        return queryset.annotate(search_rank=Case(
+            When(Q(username_lower=term) | Q(email_lower=term), then=0),
+            When(username_lower__startswith=term, then=1),
+            default=2,
+            output_field=IntegerField()
+        )).order_by('search_rank', 'username_lower', 'id')
+
+
+class SearchUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 
 class User(AbstractUser):
@@ -34,10 +86,22 @@ class User(AbstractUser):
         verbose_name='Пароль',
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+
+    objects = SearchUserManager()
 
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            PatternOpsIndex(Lower(name), name=f'user_{name}_lower_idx')
+            for name in SEARCH_FIELDS
+        ]
 
     def __str__(self):
         return self.username